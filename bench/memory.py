@@ -0,0 +1,121 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from sa import settings
+from sa.keyword_index import build_index
+from sa.records import ArticleTable
+
+from .run import _cards
+from .replay import ORIGINS
+
+# Peak memory of holding matched articles for a whole backfill, per 10,000
+# articles. Each structure is filled in its own child process, so one
+# variant's peak does not hide another's:
+#   dicts        - one record dict per (article, entity) match, as the
+#                  pipeline produces them, kept in a list
+#   table        - records.ArticleTable
+#   table_spill  - ArticleTable with a SPILL_BYTES ceiling
+# Articles are the fixture cards with unique links and titles, matching one
+# to four real entities from keywords.json.
+ARTICLES = 50000
+SPILL_BYTES = 4 * 2**20
+VARIANTS = ('dicts', 'table', 'table_spill')
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: psutil reports the peak working set
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def synthetic_records(count, seed=0):
+    """Record dicts of `count` articles, one per matched entity."""
+    cards = [(site, card) for site in ORIGINS for card in _cards(site)]
+    with open(settings.KEYWORDS_FILE, 'r', encoding='utf-8') as f:
+        entities = list(build_index(json.load(f)).entities)
+    rng = random.Random(seed)
+    for i in range(count):
+        site, card = cards[i % len(cards)]
+        # Fresh strings per article, as parsing a page would make them
+        article = {
+            'source': site,
+            'section': rng.choice(['business', 'banking-finance', 'economy', 'markets']),
+            'title': f"{card['title']} ({i})",
+            'link': f"https://{site}.example/2024/11/27/{i}/story-{i}/",
+            'excerpt': f"{card['excerpt'] or ''} {i}",
+            'published_at': f'2024-11-{rng.randint(1, 28):02d}',
+        }
+        for entity in rng.sample(entities, rng.randint(1, 4)):
+            yield dict(article, entity=entity, keyword=entity)
+
+
+def fill(variant, articles):
+    if variant == 'dicts':
+        kept = []
+        for record in synthetic_records(articles):
+            kept.append(record)
+        return kept
+    table = ArticleTable(SPILL_BYTES if variant == 'table_spill' else None, spill_dir=tempfile.gettempdir())
+    for record in synthetic_records(articles):
+        table.add(record)
+    return table
+
+
+def child(variant, articles):
+    # Warm the generator's imports and fixtures before the baseline
+    list(synthetic_records(10))
+    baseline = peak_rss()
+    started = time.perf_counter()
+    kept = fill(variant, articles)
+    seconds = time.perf_counter() - started
+    peak = peak_rss()
+    if isinstance(kept, ArticleTable):
+        kept.close()
+    return {'variant': variant, 'articles': articles, 'seconds': seconds,
+            'peak_bytes': peak - baseline if peak is not None else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.memory',
+                                     description="Peak memory of matched-article structures per 10k articles.")
+    parser.add_argument('variants', nargs='*', help=f"Structures to measure (default: all): {', '.join(VARIANTS)}.")
+    parser.add_argument('--articles', type=int, default=ARTICLES)
+    parser.add_argument('--child', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.variants) - set(VARIANTS))
+    if unknown:
+        parser.error(f"unknown structures: {', '.join(unknown)}")
+
+    if args.child:
+        print(json.dumps(child(args.child, args.articles)))
+        return
+
+    print(f"{'structure':<14}{'peak MB':>10}{'MB / 10k':>10}{'seconds':>10}")
+    for variant in args.variants or VARIANTS:
+        output = subprocess.run(
+            [sys.executable, '-m', 'bench.memory', '--child', variant, '--articles', str(args.articles)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        if result['peak_bytes'] is None:
+            print(f"{variant:<14}{'n/a':>10}{'n/a':>10}{result['seconds']:>10.2f}")
+            continue
+        megabytes = result['peak_bytes'] / 2**20
+        print(f"{variant:<14}{megabytes:>10.1f}{megabytes * 10000 / args.articles:>10.1f}{result['seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
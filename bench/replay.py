@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Serves the recorded pages in bench/fixtures as if it were the news sites:
+#   /<site>/<section>/[page/<n>/]         listing page n (404 past `depth`)
+#   /<site>/<section>/feed/[?paged=<n>]   RSS feed page n (404 past `depth`)
+#   /wp-json/wp/v2/posts|categories       WordPress REST API, at the host root
+#                                         where sa.discovery asks for it
+#   /<site>/.../YYYY/MM/DD/...            article page
+# Links in the fixtures point at the real hosts and are rewritten to the
+# replay server. Article IDs include the page number, so every page lists
+# different articles. Successful responses carry an ETag and answer a
+# matching If-None-Match with 304, like the real WordPress sites.
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ORIGINS = {
+    'bworld': 'https://www.bworldonline.com',
+    'businessmirror': 'https://businessmirror.com.ph',
+}
+
+LISTING_RE = re.compile(r'^/(?P<site>\w+)/(?P<section>[\w-]+)/(?:page/(?P<page>\d+)/)?$')
+FEED_RE = re.compile(r'^/(?P<site>\w+)/(?P<section>[\w-]+)/feed/$')
+WP_JSON_RE = re.compile(r'^/wp-json/wp/v2/(?P<endpoint>posts|categories)$')
+ARTICLE_RE = re.compile(r'^/(?P<site>\w+)/.*\d{4}/\d{2}/\d{2}/(?P<slug>[^?]*)$')
+NEXT_BLOCK_RE = re.compile(r'<!--next-->.*?<!--/next-->', re.S)
+
+
+def load_fixture(*parts):
+    with open(os.path.join(FIXTURES_DIR, *parts), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class ReplayServer:
+    """Threaded HTTP server replaying the fixtures.
+
+    `latency` (seconds, plus up to `jitter`) is added to every response,
+    `error_rate` of requests fail with 503 and listings are `depth` pages
+    deep. Faults can also target one site: `site_latency` maps site names
+    to extra seconds per response and every request to a site in `down`
+    fails with 503. Use as a context manager or call start()/stop().
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, depth=5, seed=None,
+                 site_latency=None, down=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.site_latency = dict(site_latency or {})
+        self.down = set(down)
+        self.depth = depth
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.fixtures = {
+            (site, name): load_fixture(site, f'{name}.html')
+            for site in ORIGINS
+            for name in ('listing', 'article')
+        }
+        self.feed = load_fixture('wordpress', 'feed.xml')
+        self.posts = load_fixture('wordpress', 'posts.json')
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def site_url(self, site, path=''):
+        return f'{self.base_url}/{site}/{path.lstrip("/")}'
+
+    def _rewrite(self, body):
+        for name, origin in ORIGINS.items():
+            body = body.replace(origin, f'{self.base_url}/{name}')
+        return body
+
+    def _listing(self, site, section, page):
+        if site not in ORIGINS or page > self.depth:
+            return None
+        body = self.fixtures[(site, 'listing')]
+        if page < self.depth:
+            next_url = self.site_url(site, f'{section}/page/{page + 1}/')
+            last_url = self.site_url(site, f'{section}/page/{self.depth}/')
+            body = body.replace('{{next}}', next_url).replace('{{next_page}}', str(page + 1))
+            body = body.replace('{{last}}', last_url).replace('{{last_page}}', str(self.depth))
+        else:
+            body = NEXT_BLOCK_RE.sub('', body)
+        return self._rewrite(body.replace('{{page}}', str(page)))
+
+    def route(self, path):
+        """Return (status, content type, body) for a request path."""
+        path, _, query = path.partition('?')
+        m = WP_JSON_RE.match(path)
+        if m:
+            body = self.posts if m.group('endpoint') == 'posts' else json.dumps([{'id': 1}])
+            return 200, 'application/json; charset=UTF-8', self._rewrite(body)
+        m = FEED_RE.match(path)
+        if m and m.group('site') in ORIGINS and int(parse_qs(query).get('paged', ['1'])[0]) <= self.depth:
+            return 200, 'application/rss+xml; charset=UTF-8', self._rewrite(self.feed)
+        m = LISTING_RE.match(path)
+        if m:
+            body = self._listing(m.group('site'), m.group('section'), int(m.group('page') or 1))
+            if body is not None:
+                return 200, 'text/html; charset=UTF-8', body
+        m = ARTICLE_RE.match(path)
+        if m and m.group('site') in ORIGINS:
+            body = self.fixtures[(m.group('site'), 'article')].replace('{{title}}', m.group('slug').strip('/'))
+            return 200, 'text/html; charset=UTF-8', self._rewrite(body)
+        return 404, 'text/plain', 'Not found'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                site = self.path.split('/')[1]
+                with server.lock:
+                    server.requests += 1
+                    delay = server.latency + server.random.uniform(0, server.jitter) + server.site_latency.get(site, 0.0)
+                    failed = site in server.down or server.random.random() < server.error_rate
+                    if failed:
+                        server.errors += 1
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    status, content_type, body = 503, 'text/plain', 'Service unavailable'
+                else:
+                    status, content_type, body = server.route(self.path)
+                payload = body.encode('utf-8')
+                etag = f'"{hashlib.sha1(payload).hexdigest()}"' if status == 200 else None
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='replay', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the benchmark fixtures as a local news site.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra seconds, random.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument('--depth', type=int, default=5, help="Listing pages per section.")
+    parser.add_argument('--slow', action='append', default=[], metavar='SITE=SECONDS',
+                        help="Extra latency for one site (repeatable).")
+    parser.add_argument('--down', action='append', default=[], metavar='SITE',
+                        help="Answer every request for this site with 503 (repeatable).")
+    args = parser.parse_args(argv)
+
+    site_latency = {}
+    for item in args.slow:
+        site, _, seconds = item.partition('=')
+        site_latency[site] = float(seconds)
+    server = ReplayServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, depth=args.depth, site_latency=site_latency, down=args.down)
+    print(f"Replaying fixtures on {server.base_url}, e.g. {server.site_url('bworld', 'banking-finance/')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from scipy import sparse
+
+from sa import settings
+from sa.crawl import run_crawl
+from sa.dates import _parse_cached, distinct_samples, parse_date
+from sa.dedup import Deduplicator
+from sa.fetcher import HttpPage
+from sa.fuzzy import FuzzyIndex
+from sa.incidence import MentionAggregates
+from sa.keyword_index import build_index, load_index
+from sa.pipeline import CsvSink
+from sa.ratelimit import HostRateLimiter
+from sa.sites import load_sites
+
+from .replay import ORIGINS, ReplayServer, load_fixture
+
+# Offline benchmarks over the recorded fixtures. Each scenario returns a
+# callable and the number of items it processes per call; the callable is
+# timed for a number of rounds after one warm-up call. Results are appended
+# to a JSON history keyed by commit so regressions show up run over run.
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.json')
+REGRESSION_THRESHOLD = 0.10  # Flag scenarios whose mean got this much slower
+SYNTHETIC_KEYWORDS = 50000
+DEDUP_ARTICLES = 2000
+INCIDENCE_DAYS = 365
+INCIDENCE_ARTICLES = 150  # Matched articles per day
+INCIDENCE_ENTITIES = 700
+E2E_DEPTH = 5
+E2E_LATENCY = 0.02
+
+SCENARIOS = {}
+TEMP_DIRS = []
+
+
+def scenario(name, unit):
+    def register(setup):
+        SCENARIOS[name] = (setup, unit)
+        return setup
+    return register
+
+
+def _cards(site):
+    sites = load_sites()
+    html = load_fixture(site, 'listing.html').replace('{{page}}', '1')
+    return HttpPage(ORIGINS[site] + '/', html.encode('utf-8')).cards(sites[site].site['selectors'])
+
+
+def _article_texts():
+    texts = [f"{card['title']} {card['excerpt'] or ''}" for site in ORIGINS for card in _cards(site)]
+    body = HttpPage('https://example.invalid/', load_fixture('bworld', 'article.html').encode('utf-8'))
+    texts.append(' '.join(body.texts('div.td-post-content p')))
+    return texts
+
+
+def synthetic_keywords(count, seed=0):
+    """Real keywords plus generated company names, `count` entries in total."""
+    with open(settings.KEYWORDS_FILE, 'r', encoding='utf-8') as f:
+        keywords = json.load(f)
+    rng = random.Random(seed)
+    words = ['pacific', 'metro', 'global', 'prime', 'capital', 'union', 'island', 'summit', 'first',
+             'golden', 'royal', 'digital', 'united', 'north', 'south', 'east', 'west', 'rural', 'savings',
+             'lending', 'payments', 'credit', 'finance', 'holdings', 'ventures', 'trust', 'fintech', 'pay']
+    suffixes = ['inc.', 'corp.', 'corporation', 'bank', 'co.', 'ltd.', 'cooperative']
+    while len(keywords) < count:
+        name = ' '.join(rng.sample(words, rng.randint(2, 3)))
+        keywords.append(f"{name} {rng.choice(suffixes)} {rng.randint(1, 9999)}")
+    return keywords
+
+
+@scenario('extract_bworld', 'page')
+def extract_bworld():
+    site = load_sites()['bworld'].site
+    html = load_fixture('bworld', 'listing.html').replace('{{page}}', '1').encode('utf-8')
+    return lambda: HttpPage(ORIGINS['bworld'] + '/', html).cards(site['selectors']), 1
+
+
+@scenario('extract_businessmirror', 'page')
+def extract_businessmirror():
+    site = load_sites()['businessmirror'].site
+    html = load_fixture('businessmirror', 'listing.html').replace('{{page}}', '1').encode('utf-8')
+    return lambda: HttpPage(ORIGINS['businessmirror'] + '/', html).cards(site['selectors']), 1
+
+
+@scenario('match_668_keywords', 'article')
+def match_real_keywords():
+    index = load_index(settings.KEYWORDS_FILE)
+    texts = _article_texts()
+    return lambda: [index.match(text) for text in texts], len(texts)
+
+
+@scenario('match_668_fuzzy', 'article')
+def match_fuzzy_keywords():
+    # Compare with match_668_keywords: fuzzy mode should cost a small factor more
+    index = FuzzyIndex(load_index(settings.KEYWORDS_FILE))
+    texts = _article_texts()
+    index.match(' '.join(texts))  # Fill the word cache as a running crawl would
+    return lambda: [index.match(text) for text in texts], len(texts)
+
+
+@scenario('match_50k_keywords', 'article')
+def match_synthetic_keywords():
+    index = build_index(synthetic_keywords(SYNTHETIC_KEYWORDS))
+    texts = _article_texts()
+    return lambda: [index.match(text) for text in texts], len(texts)
+
+
+@scenario('parse_dates', 'date')
+def parse_dates():
+    # Distinct strings with a cleared cache: every date is actually parsed
+    texts = distinct_samples(200)
+
+    def run():
+        _parse_cached.cache_clear()
+        return [parse_date(text) for text in texts]
+    return run, len(texts)
+
+
+@scenario('dedup_articles', 'article')
+def dedup_articles():
+    # Every card repeated under many links and with a varying word, so each
+    # story has many near-duplicate members across both sources
+    cards = [(site, card) for site in ORIGINS for card in _cards(site)]
+    records = []
+    for i in range(DEDUP_ARTICLES):
+        site, card = cards[i % len(cards)]
+        record = {'source': site, 'section': 'business', 'entity': 'banks', 'keyword': 'banks',
+                  'title': card['title'], 'link': f"{card['link']}{i}/", 'excerpt': card['excerpt']}
+        records.append((record, f"{card['title']} {card['excerpt']} update {i}"))
+
+    def run():
+        dedup = Deduplicator()
+        for record, text in records:
+            dedup.add(record, text)
+        return dedup.stories()
+    return run, len(records)
+
+
+@scenario('mention_queries', 'lookup')
+def mention_queries():
+    # A year of daily incidence matrices with a skewed entity distribution;
+    # each call asks for the year's top entities, one entity's co-mentions
+    # and its daily counts
+    directory = tempfile.mkdtemp(prefix='sa-bench-')
+    TEMP_DIRS.append(directory)
+    aggregates = MentionAggregates(directory)
+    for j in range(INCIDENCE_ENTITIES):
+        aggregates.vocabulary.id(f'entity {j}')
+    rng = np.random.default_rng(0)
+    first = datetime.date.today() - datetime.timedelta(days=INCIDENCE_DAYS - 1)
+    for day in range(INCIDENCE_DAYS):
+        rows = np.repeat(np.arange(INCIDENCE_ARTICLES), 3)
+        cols = rng.zipf(1.5, rows.size) % INCIDENCE_ENTITIES
+        matrix = sparse.csr_matrix((np.ones(rows.size, dtype=np.int32), (rows, cols)),
+                                   shape=(INCIDENCE_ARTICLES, INCIDENCE_ENTITIES))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        aggregates.add_day(first + datetime.timedelta(days=day), matrix)
+
+    def run():
+        return (aggregates.totals(first, n=20), aggregates.co_mentions('entity 1', first, n=20),
+                aggregates.daily_counts('entity 1', first))
+    return run, 3
+
+
+@scenario('write_csv', 'row')
+def write_csv():
+    adapter = load_sites()['bworld']
+    rows = [
+        {'entity': 'asia united bank', 'keyword': 'aub', 'title': card['title'], 'link': card['link'],
+         'excerpt': card['excerpt'], 'publication_date': '2024-11-27'}
+        for card in _cards('bworld')
+    ] * 50
+    directory = tempfile.mkdtemp(prefix='sa-bench-')
+    TEMP_DIRS.append(directory)
+
+    def run():
+        sink = CsvSink(os.path.join(directory, 'bwdata.csv'), adapter.csv_header, append=False)
+        try:
+            for start in range(0, len(rows), 12):
+                sink.write(adapter.csv_rows(rows[start:start + 12]))
+        finally:
+            sink.close()
+    return run, len(rows)
+
+
+@scenario('e2e_pages', 'page')
+def end_to_end():
+    sites = load_sites()
+    names = ['bworld', 'businessmirror']
+    sections = {'bworld': 'banking-finance/', 'businessmirror': 'business/'}
+    server = ReplayServer(latency=E2E_LATENCY, depth=E2E_DEPTH, seed=0).start()
+    urls = {name: [server.site_url(name, sections[name])] for name in names}
+    directory = tempfile.mkdtemp(prefix='sa-bench-')
+    TEMP_DIRS.append(directory)
+
+    def run():
+        data_dir, settings.DATA_DIR = settings.DATA_DIR, directory
+        try:
+            run_crawl(names, limiter=HostRateLimiter(1000.0, 100), urls=urls, max_pages=E2E_DEPTH, sites=sites)
+        finally:
+            settings.DATA_DIR = data_dir
+    return run, E2E_DEPTH * len(names)
+
+
+def measure(func, items, rounds):
+    func()  # Warm-up: imports, caches, connection pools
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    mean = statistics.mean(timings)
+    return {
+        'rounds': rounds,
+        'items': items,
+        'min': min(timings),
+        'max': max(timings),
+        'mean': mean,
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if rounds > 1 else 0.0,
+        'per_item_us': mean / items * 1e6,
+        'items_per_sec': items / mean if mean else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True)
+        return commit.stdout.strip(), bool(dirty.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def previous_results(history, name):
+    for entry in reversed(history):
+        if name in entry['results']:
+            return entry
+    return None
+
+
+def report(results, history, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for name, stats in results.items():
+        unit = SCENARIOS[name][1]
+        line = (f"{name:<24}{stats['per_item_us']:12.1f} us/{unit:<8}"
+                f"{stats['items_per_sec']:12.1f} {unit}s/s  ±{stats['stddev'] / stats['mean'] * 100 if stats['mean'] else 0:4.1f}%")
+        if name == 'e2e_pages':
+            line += f"  ({stats['items_per_sec'] * 60:.0f} pages/min)"
+        previous = previous_results(history, name)
+        if previous:
+            change = stats['mean'] / previous['results'][name]['mean'] - 1
+            line += f"  {change:+.1%} vs {previous['commit']}"
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.run', description="Run the offline scraper benchmarks.")
+    parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run (default: all): {', '.join(SCENARIOS)}.")
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--e2e-rounds', type=int, default=3)
+    parser.add_argument('--history', default=HISTORY_FILE, help="JSON history file.")
+    parser.add_argument('--no-save', action='store_true', help="Do not append this run to the history.")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Relative slowdown reported as a regression.")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {}
+    try:
+        for name in args.scenarios or SCENARIOS:
+            setup, _ = SCENARIOS[name]
+            func, items = setup()
+            rounds = args.e2e_rounds if name == 'e2e_pages' else args.rounds
+            results[name] = measure(func, items, rounds)
+    finally:
+        for directory in TEMP_DIRS:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    history = load_history(args.history)
+    commit, dirty = git_commit()
+    regressions = report(results, history, args.threshold)
+    if not args.no_save:
+        history.append({
+            'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        })
+        save_history(args.history, history)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
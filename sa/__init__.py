@@ -0,0 +1 @@
+"""Keyword monitoring for Philippine business news sites."""
@@ -0,0 +1,5 @@
+from .crawl import main
+
+# Guarded so worker processes started with 'spawn' (Windows) do not re-run the crawl
+if __name__ == "__main__":
+    main()
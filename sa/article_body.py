@@ -0,0 +1,191 @@
+import datetime
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lxml.html
+import requests
+
+from .fetcher import DEFAULT_HEADERS, _clean
+from .resilience import http_get
+from .seen_store import article_key
+
+# Optional second stage: download each candidate article and extract its main
+# text so keywords mentioned only in the body are matched too. Bodies are
+# cached by article key together with two content hashes:
+#   card_hash - title/excerpt/date from the listing; if unchanged the article
+#               is not downloaded again
+#   html_hash - the downloaded page; if unchanged it is not parsed again
+BODY_WORKERS = 4
+BODY_TIMEOUT = 30
+
+
+def content_hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def extract_text(html, url, selector=None):
+    """Main text of an article page.
+
+    Uses the site's body selector when given, then newspaper3k, then every
+    <p> on the page.
+    """
+    doc = lxml.html.document_fromstring(html)
+    if selector:
+        paragraphs = [_clean(el.text_content()) for el in doc.cssselect(selector)]
+        text = '\n'.join(p for p in paragraphs if p)
+        if text:
+            return text
+    try:
+        from newspaper import Article
+        article = Article(url)
+        article.download(input_html=html)
+        article.parse()
+        if article.text:
+            return article.text
+    except ImportError:
+        pass
+    except Exception as e:
+        logging.warning("newspaper3k could not parse %s: %s", url, e)
+    return '\n'.join(p for p in (_clean(el.text_content()) for el in doc.iter('p')) if p)
+
+
+class BodyCache:
+    """Extracted article bodies keyed by source and article key, backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS bodies ('
+                ' source TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' card_hash TEXT,'
+                ' html_hash TEXT,'
+                ' body TEXT,'
+                ' fetched_at TEXT,'
+                ' PRIMARY KEY (source, key))'
+            )
+
+    def get(self, source, key):
+        """Return (card_hash, html_hash, body) or None."""
+        with self.lock:
+            return self.conn.execute(
+                'SELECT card_hash, html_hash, body FROM bodies WHERE source = ? AND key = ?', (source, key)
+            ).fetchone()
+
+    def put(self, source, key, card_hash, html_hash, body):
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO bodies VALUES (?, ?, ?, ?, ?, ?)',
+                (source, key, card_hash, html_hash, body, now),
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+        logging.info("Closed article body cache %s.", self.path)
+
+
+class BodyFetcher:
+    """Fills article['body'] for listing cards using a bounded thread pool.
+
+    One instance is shared by every crawl section, so at most `workers`
+    article pages are downloaded at a time across the whole run. Requests go
+    through the crawl's per-host rate limiter when one is given, and through
+    `http_cache` (an HttpCache) and `resilience` (a Resilience) when given.
+    """
+
+    def __init__(self, cache=None, workers=BODY_WORKERS, limiter=None, timeout=BODY_TIMEOUT, headers=None,
+                 http_cache=None, resilience=None):
+        self.cache = cache
+        self.http_cache = http_cache
+        self.resilience = resilience
+        self.limiter = limiter
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='body')
+        self.lock = threading.Lock()
+        self.stats = {
+            'articles': 0,
+            'downloaded': 0,
+            'parsed': 0,
+            'cache_hits': 0,
+            'unchanged_html': 0,
+            'errors': 0,
+            'seconds': 0.0,
+        }
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _body(self, article, site):
+        source = site['name']
+        key = article_key(article['link'])
+        card_hash = content_hash(article['title'], article.get('excerpt'), article.get('date'))
+        cached = self.cache.get(source, key) if self.cache is not None else None
+        if cached and cached[0] == card_hash:
+            self._count('cache_hits')
+            return cached[2]
+
+        if self.limiter is not None:
+            self.limiter.acquire(article['link'])
+        response = http_get(self.session, article['link'], self.timeout, self.http_cache, self.resilience)
+        response.raise_for_status()
+        self._count('downloaded')
+        html_hash = hashlib.sha1(response.content).hexdigest()
+        if cached and cached[1] == html_hash:
+            self._count('unchanged_html')
+            body = cached[2]
+        else:
+            body = extract_text(response.content, response.url, site['selectors'].get('body'))
+            self._count('parsed')
+        if self.cache is not None:
+            self.cache.put(source, key, card_hash, html_hash, body)
+        return body
+
+    def _fill_one(self, article, site):
+        try:
+            article['body'] = self._body(article, site)
+        except Exception as e:
+            self._count('errors')
+            article['body'] = None
+            logging.warning("[%s] Could not fetch article body %s: %s", site['name'], article['link'], e)
+
+    def fill(self, articles, site):
+        """Set 'body' on every article (None when it could not be fetched)."""
+        if not articles:
+            return articles
+        started = time.monotonic()
+        list(self.pool.map(lambda article: self._fill_one(article, site), articles))
+        elapsed = time.monotonic() - started
+        self._count('articles', len(articles))
+        self._count('seconds', elapsed)
+        rate = len(articles) / elapsed if elapsed else float('inf')
+        logging.info("[%s] Fetched %s article bodies in %.2fs (%.1f articles/s).", site['name'], len(articles), elapsed, rate)
+        return articles
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.stats)
+        seconds = metrics['seconds']
+        metrics['articles_per_second'] = metrics['articles'] / seconds if seconds else 0.0
+        return metrics
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.session.close()
+        if self.stats['articles']:
+            logging.info("Article body metrics: %s", self.metrics())
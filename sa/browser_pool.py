@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+
+from .metrics import REGISTRY, count, gauge
+
+# Listing pages only need the DOM, so skip everything that is not HTML or
+# first-party script. Images are also disabled through Chrome prefs; fonts and
+# third-party trackers are blocked over CDP.
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm',
+    '*googletagmanager.com*', '*google-analytics.com*', '*googlesyndication.com*',
+    '*doubleclick.net*', '*adservice.google.*', '*facebook.net*', '*facebook.com/tr*',
+    '*twitter.com/widgets*', '*platform.twitter.com*', '*scorecardresearch.com*',
+    '*quantserve.com*', '*taboola.com*', '*outbrain.com*', '*hotjar.com*',
+]
+
+POOL_SIZE = 2
+RECYCLE_AFTER = 50  # Pages served before a driver is replaced
+ACQUIRE_TIMEOUT = 300.0  # Seconds to wait for a driver before giving up
+
+
+def init_driver(chromedriver_path, headless=True, block_resources=False):
+    # Imported here so crawls that never need Chrome do not pay for selenium
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options
+    from selenium.common.exceptions import WebDriverException
+
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--disable-infobars')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    if block_resources:
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.managed_default_content_settings.plugins': 2,
+            'profile.managed_default_content_settings.notifications': 2,
+        })
+
+    try:
+        service = ChromeService(executable_path=chromedriver_path)
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        logging.info("Initialized Chrome WebDriver successfully.")
+    except WebDriverException as e:
+        logging.error("Error initializing Chrome WebDriver: %s", e)
+        raise
+
+    if block_resources:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        except WebDriverException as e:
+            logging.warning("Could not block resources over CDP: %s", e)
+    return driver
+
+
+class Lease:
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.leased_at = None
+
+
+class DriverPool:
+    """Keeps up to `size` warm Chrome instances and leases them to crawl tasks.
+
+    Drivers are started on demand and reused across leases. A driver is quit
+    and replaced once it has served `recycle_after` pages, or immediately when
+    it is released as broken after a WebDriverException.
+    """
+
+    def __init__(self, chromedriver_path, size=POOL_SIZE, recycle_after=RECYCLE_AFTER,
+                 headless=True, block_resources=True):
+        self.chromedriver_path = chromedriver_path
+        self.size = size
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.block_resources = block_resources
+        self.idle = []
+        self.in_use = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'recycled': 0,
+            'broken': 0,
+            'leases': 0,
+            'lease_seconds_total': 0.0,
+            'lease_seconds_max': 0.0,
+            'wait_seconds_total': 0.0,
+        }
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Lease a driver, waiting up to `timeout` seconds (None: forever)."""
+        started = time.monotonic()
+        with self.condition:
+            while not self.idle and self.in_use >= self.size:
+                if self.closed:
+                    raise RuntimeError("Driver pool is closed.")
+                remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                if (remaining is not None and remaining <= 0) or not self.condition.wait(remaining):
+                    raise TimeoutError(f"No WebDriver became available within {timeout}s.")
+            lease = self.idle.pop() if self.idle else None
+            self.in_use += 1
+
+        if lease is None:
+            try:
+                lease = Lease(init_driver(self.chromedriver_path, self.headless, self.block_resources))
+            except Exception:
+                with self.condition:
+                    self.in_use -= 1
+                    self.condition.notify()
+                raise
+            with self.condition:
+                self.stats['created'] += 1
+            count('drivers_created')
+
+        lease.leased_at = time.monotonic()
+        with self.condition:
+            self.stats['leases'] += 1
+            self.stats['wait_seconds_total'] += lease.leased_at - started
+        REGISTRY.observe('driver_lease_wait', lease.leased_at - started)
+        self.record_metrics()
+        return lease
+
+    def release(self, lease, broken=False):
+        held = time.monotonic() - lease.leased_at
+        recycle = broken or lease.pages >= self.recycle_after or self.closed
+        if recycle:
+            self._quit(lease)
+
+        with self.condition:
+            self.in_use -= 1
+            self.stats['lease_seconds_total'] += held
+            self.stats['lease_seconds_max'] = max(self.stats['lease_seconds_max'], held)
+            if broken:
+                self.stats['broken'] += 1
+            if recycle:
+                self.stats['recycled'] += 1
+            else:
+                self.idle.append(lease)
+            self.condition.notify()
+        REGISTRY.observe('driver_lease', held)
+        if broken:
+            count('drivers_broken')
+        if recycle:
+            count('drivers_recycled')
+        self.record_metrics()
+
+    def _quit(self, lease):
+        try:
+            lease.driver.quit()
+        except Exception as e:
+            logging.warning("Error quitting WebDriver: %s", e)
+
+    def metrics(self):
+        with self.condition:
+            metrics = dict(self.stats)
+            metrics['size'] = self.size
+            metrics['recycle_after'] = self.recycle_after
+            metrics['idle'] = len(self.idle)
+            metrics['in_use'] = self.in_use
+        leases = metrics['leases']
+        metrics['lease_seconds_avg'] = metrics['lease_seconds_total'] / leases if leases else 0.0
+        return metrics
+
+    def record_metrics(self):
+        """Set the pool's gauges in metrics.REGISTRY; lease wait and hold
+        times and driver churn are recorded as they happen."""
+        with self.condition:
+            gauge('browser_pool_size', self.size)
+            gauge('browser_pool_recycle_after', self.recycle_after)
+            gauge('browser_pool_idle', len(self.idle))
+            gauge('browser_pool_in_use', self.in_use)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.condition.notify_all()
+        for lease in idle:
+            self._quit(lease)
+        if idle:
+            logging.info("Closed %s pooled web drivers.", len(idle))
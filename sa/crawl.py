@@ -0,0 +1,464 @@
+import argparse
+import datetime
+import importlib.util
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from . import settings
+from .browser_pool import DriverPool
+from .fetcher import WarmFetchers, open_fetcher
+from .article_body import BodyCache, BodyFetcher
+from .discovery import FeedDiscovery
+from .fuzzy import FUZZY_THRESHOLD, FuzzyIndex
+from .http_cache import CACHE_MAX_BYTES, CACHE_TTL, HttpCache
+from .keyword_index import load_index
+from .logs import configure_logging, log_context
+from .metrics import REGISTRY, Profiler, count, site_context, timer
+from .pipeline import (
+    Checkpoint,
+    CsvSink,
+    collect_incidence,
+    collect_stories,
+    score_sentiment,
+    extract_articles,
+    fetch_bodies,
+    fetch_feed_pages,
+    fetch_pages,
+    fetch_pages_parallel,
+    match_articles,
+    write_batches,
+)
+from .ratelimit import HostRateLimiter
+from .resilience import RETRIES, Resilience
+from .seen_store import SeenStore
+from .sentiment import DEFAULT_CACHE as SENTIMENT_CACHE
+from .sentiment import SENTIMENT_FILE, SENTIMENT_HEADER, SENTIMENT_WORKERS, SentimentCache, SentimentScorer
+from .sites import day_directory, load_sites
+
+SEEN_DB = os.path.join(settings.DATA_DIR, 'seen.sqlite3')
+ARCHIVE_DIR = os.path.join(settings.DATA_DIR, 'archive')
+CHECKPOINT_FILE = os.path.join(settings.DATA_DIR, 'crawl.checkpoint.json')
+BODY_CACHE = os.path.join(settings.DATA_DIR, 'bodies.sqlite3')
+BODY_WORKERS = 4
+METRICS_DIR = os.path.join(settings.DATA_DIR, 'metrics')
+
+MAX_WORKERS = 6
+HOST_RATE = 1.0  # Requests per second per host
+HOST_BURST = 2
+HOST_RATES = {}  # Per-host overrides, e.g. {'businessmirror.com.ph': 0.5}
+BROWSER_POOL_SIZE = 2
+BROWSER_RECYCLE_AFTER = 50
+MAX_MEMORY = 256 * 2**20  # Bytes of each run-wide article table before it spills to disk
+
+
+def section_name(url):
+    parts = [p for p in urlsplit(url).path.split('/') if p]
+    return parts[0] if parts else urlsplit(url).netloc
+
+
+class CrawlContext:
+    """Run-wide collaborators shared by every section of a crawl.
+
+    Only `index`, `limiter` and `sinks` are required:
+      index          - keyword index matched against each article
+      limiter        - HostRateLimiter paced per host
+      sinks          - {site name: CsvSink} of the day's CSVs
+      browsers       - DriverPool for Selenium pages
+      seen           - SeenStore; skips seen articles and stops at an all-seen page
+      max_pages      - overrides each site's max_pages, e.g. for backfills
+      store          - ArticleStore, the Parquet archive
+      checkpoint     - Checkpoint; resumes sections of an interrupted run
+      scraped_at     - timestamp written with each row
+      bodies         - BodyFetcher; matches new articles on their full text
+      discovery      - FeedDiscovery; lists sections through wp-json/RSS
+      http_cache     - HttpCache; revalidates listing pages
+      stories        - Deduplicator clustering near-duplicate stories
+      sentiment      - SentimentScorer, writing to sentiment_sink
+      resilience     - Resilience; retries, adaptive timeouts, circuit breaker
+      incidence      - IncidenceBuilder of the day's article x entity matrix
+    """
+
+    def __init__(self, index, limiter, sinks, browsers=None, seen=None, max_pages=None, store=None,
+                 checkpoint=None, scraped_at=None, bodies=None, discovery=None, http_cache=None, stories=None,
+                 sentiment=None, sentiment_sink=None, resilience=None, incidence=None):
+        self.index = index
+        self.limiter = limiter
+        self.sinks = sinks
+        self.browsers = browsers
+        self.seen = seen
+        self.max_pages = max_pages
+        self.store = store
+        self.checkpoint = checkpoint
+        self.scraped_at = scraped_at
+        self.bodies = bodies
+        self.discovery = discovery
+        self.http_cache = http_cache
+        self.stories = stories
+        self.sentiment = sentiment
+        self.sentiment_sink = sentiment_sink
+        self.resilience = resilience
+        self.incidence = incidence
+
+
+def crawl_section(adapter, base_url, context, fetchers=None):
+    """Stream one section through fetch -> extract -> match -> write.
+
+    `context` is the run's CrawlContext. Listing pages are fetched through
+    `fetchers` (a WarmFetchers) when given, which keeps them open for the
+    next crawl of the section; otherwise they are closed at the end.
+    Returns (checkpoint key, pages written, articles written).
+    """
+    site = adapter.site
+    limiter, checkpoint, discovery = context.limiter, context.checkpoint, context.discovery
+    max_pages = context.max_pages or adapter.max_pages
+    feed = None
+    if discovery is not None and site.get('discovery'):
+        with timer('discover_plan'):
+            feed = discovery.plan(base_url, site['discovery'], limiter)
+    if feed is not None:
+        key = f"{site['name']}|{base_url}|{feed[0]}"
+        first_url = feed[1]
+    else:
+        key = f"{site['name']}|{base_url}"
+        first_url = base_url
+    start = checkpoint.resume_point(key, first_url) if checkpoint is not None else (first_url, 0)
+    if start is None:
+        logging.info("[%s] %s already finished in the interrupted run; skipping.", site['name'], base_url,
+                     extra={'section': base_url})
+        return key, 0, 0
+    start_url, first_page = start
+
+    def open_page_fetcher():
+        return open_fetcher(site, adapter.chromedriver_path, timeout=adapter.timeout, pool=context.browsers,
+                            http_cache=context.http_cache, resilience=context.resilience)
+
+    warm = fetchers
+    if warm is None:
+        fetchers = WarmFetchers()
+    fetcher = None
+    try:
+        if feed is not None:
+            batches = fetch_feed_pages(discovery, limiter, start_url, first_page, max_pages, site)
+        elif adapter.parallel_pages:
+            batches = fetch_pages_parallel(
+                lambda: fetchers.checkout(open_page_fetcher), limiter, start_url, first_page, max_pages, site,
+                adapter.plan_pages, adapter.parallel_pages, close_page_fetcher=fetchers.checkin,
+            )
+        else:
+            fetcher = fetchers.checkout(open_page_fetcher)
+            batches = fetch_pages(fetcher, limiter, start_url, first_page, max_pages, site, adapter.next_page_url)
+        batches = extract_articles(batches, site, context.seen)
+        if context.bodies is not None:
+            batches = fetch_bodies(batches, context.bodies, site)
+        batches = match_articles(batches, adapter, context.index, section_name(base_url))
+        if context.sentiment is not None:
+            batches = score_sentiment(batches, context.sentiment, context.sentiment_sink)
+        if context.stories is not None:
+            batches = collect_stories(batches, context.stories)
+        if context.incidence is not None:
+            batches = collect_incidence(batches, context.incidence)
+        return (key,) + write_batches(batches, adapter, context.sinks[adapter.name], key, checkpoint, context.seen,
+                                      context.store, context.scraped_at)
+    except Exception as e:
+        logging.error("[%s] Error scraping %s: %s", site['name'], base_url, e, extra={'section': base_url})
+        count('errors')
+        if checkpoint is not None:
+            checkpoint.fail(key)
+        return key, 0, 0
+    finally:
+        if fetcher is not None:
+            fetchers.checkin(fetcher)
+        if warm is None:
+            fetchers.close()
+
+
+def _section_task(profiler, adapter, base_url, context, fetchers=None):
+    # Runs on a worker thread: label its metrics and logs with the site and
+    # section, and profile it if asked
+    with site_context(adapter.name), log_context(section=section_name(base_url)):
+        if profiler is not None:
+            return profiler.run(crawl_section, adapter, base_url, context, fetchers)
+        return crawl_section(adapter, base_url, context, fetchers)
+
+
+def load_keywords(fuzzy_threshold=None):
+    """The keyword index, fuzzy when `fuzzy_threshold` is given; None if empty."""
+    index = load_index(settings.KEYWORDS_FILE)
+    if not index:
+        logging.error("No keywords loaded.")
+        return None
+    if fuzzy_threshold is not None:
+        index = FuzzyIndex(index, fuzzy_threshold)
+    return index
+
+
+def write_stories(stories, day):
+    """Append the clusters of a Deduplicator to the day's stories.csv."""
+    from .dedup import STORIES_FILE, STORY_HEADER, story_rows
+    clusters = stories.stories()
+    sink = CsvSink(os.path.join(day_directory(day), STORIES_FILE), STORY_HEADER)
+    try:
+        sink.write(story_rows(clusters))
+    finally:
+        sink.close()
+    count('stories', len(clusters))
+    count('duplicates', len(stories) - len(clusters))
+    logging.info("Clustered %s matched articles into %s stories.", len(stories), len(clusters))
+
+
+def save_incidence(incidence):
+    """Save a day's IncidenceBuilder and fold it into the mention aggregates."""
+    from .incidence import INCIDENCE_DIR, MentionAggregates
+    incidence.save()
+    MentionAggregates(INCIDENCE_DIR).update()
+
+
+def open_incidence(day, max_bytes=None):
+    # numpy and scipy are only imported when the incidence matrix is kept
+    from .incidence import ENTITIES_FILE, INCIDENCE_DIR, EntityVocabulary, IncidenceBuilder
+    return IncidenceBuilder(EntityVocabulary(os.path.join(INCIDENCE_DIR, ENTITIES_FILE)), day, max_bytes)
+
+
+def run_crawl(site_names=None, max_workers=MAX_WORKERS, limiter=None, urls=None,
+              pool_size=BROWSER_POOL_SIZE, seen=None, max_pages=None, store=None, checkpoint=None,
+              bodies=None, discovery=None, sites=None, profiler=None, http_cache=None, fuzzy_threshold=None,
+              dedup=False, sentiment=None, resilience=None, incidence=False, max_memory=None):
+    """Crawl every section of the selected sites concurrently.
+
+    Sections run as tasks on `max_workers` threads, sharing the collaborators
+    described on CrawlContext; `dedup` and `incidence` turn on the run's
+    Deduplicator and IncidenceBuilder, whose article tables spill to disk
+    past `max_memory` bytes, and `fuzzy_threshold` (0-100) matches keywords
+    approximately. `urls` overrides section URLs per site name and `sites`
+    the profiles from sites.json. Rows are streamed into each site's CSV for
+    the day, appended to with a SeenStore and rewritten without one. The
+    checkpoint is cleared once every section has returned. Returns
+    {site name: CSV path}.
+    """
+    REGISTRY.reset()
+    index = load_keywords(fuzzy_threshold)
+    if index is None:
+        return {}
+
+    limiter = limiter or HostRateLimiter(HOST_RATE, HOST_BURST, HOST_RATES)
+    resilience = resilience or Resilience(limiter=limiter)
+    sites = sites or load_sites()
+    adapters = [sites[name] for name in (site_names or sites)]
+    urls = urls or {}
+    append = seen is not None or (checkpoint is not None and checkpoint.resuming)
+    browsers = DriverPool(
+        settings.CHROMEDRIVER_PATH, size=pool_size, recycle_after=BROWSER_RECYCLE_AFTER
+    )
+    sinks = {
+        adapter.name: CsvSink(adapter.output_path(), adapter.csv_header, append=append)
+        for adapter in adapters
+    }
+
+    stories = None
+    if dedup:
+        # numpy is only imported when clustering stories
+        from .dedup import Deduplicator
+        stories = Deduplicator(max_bytes=max_memory)
+    sentiment_sink = None
+    if sentiment is not None:
+        if sentiment.contexts and sentiment.index is None:
+            sentiment.index = index
+        sentiment_sink = CsvSink(os.path.join(day_directory(), SENTIMENT_FILE), SENTIMENT_HEADER)
+
+    started = time.monotonic()
+    scraped_at = datetime.datetime.now()
+    mentions = open_incidence(scraped_at.date(), max_memory) if incidence else None
+    context = CrawlContext(
+        index, limiter, sinks, browsers=browsers, seen=seen, max_pages=max_pages, store=store,
+        checkpoint=checkpoint, scraped_at=scraped_at, bodies=bodies, discovery=discovery, http_cache=http_cache,
+        stories=stories, sentiment=sentiment, sentiment_sink=sentiment_sink, resilience=resilience,
+        incidence=mentions,
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as workers:
+            futures = [
+                workers.submit(_section_task, profiler, adapter, url, context)
+                for adapter in adapters
+                for url in urls.get(adapter.name, adapter.urls)
+            ]
+            sections = [future.result() for future in futures]
+    finally:
+        for sink in sinks.values():
+            sink.close()
+        if sentiment_sink is not None:
+            sentiment_sink.close()
+        if browsers.stats['created']:
+            logging.info("Browser pool metrics: %s", browsers.metrics())
+        browsers.close()
+
+    # Every section returned: the run was not interrupted, even if some failed
+    if checkpoint is not None:
+        checkpoint.clear()
+    pages = sum(pages for _, pages, _ in sections)
+    try:
+        if stories is not None and len(stories):
+            write_stories(stories, scraped_at)
+        if mentions is not None and len(mentions):
+            save_incidence(mentions)
+    finally:
+        for table in (stories, mentions):
+            if table is not None:
+                table.close()
+
+    logging.info("Host health: %s", resilience.metrics())
+    logging.info("Crawled %s pages from %s sites in %.1fs.", pages, len(adapters), time.monotonic() - started)
+    logging.info("Seconds per stage: %s", ', '.join(f"{stage}={seconds:.2f}" for stage, seconds in REGISTRY.summary().items()))
+    return {name: sink.path for name, sink in sinks.items()}
+
+
+def main(argv=None):
+    sites = load_sites()
+    parser = argparse.ArgumentParser(prog='python -m sa', description="Crawl all configured news sites concurrently.")
+    parser.add_argument('--sites', nargs='+', choices=sorted(sites), help="Sites to crawl (default: all).")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Worker threads.")
+    parser.add_argument('--rate', type=float, default=HOST_RATE, help="Requests per second per host.")
+    parser.add_argument('--max-pages', type=int, help="Override each site's max_pages (e.g. for backfills).")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignore the seen-article store and rewrite today's CSVs from scratch.")
+    parser.add_argument('--no-archive', action='store_true', help="Do not append to the Parquet archive.")
+    parser.add_argument('--bodies', action='store_true',
+                        help="Also download each new article and match keywords in its full text.")
+    parser.add_argument('--body-workers', type=int, default=BODY_WORKERS,
+                        help="Article pages downloaded at a time with --bodies.")
+    parser.add_argument('--html-only', action='store_true',
+                        help="List sections through their HTML pages instead of wp-json/RSS feeds.")
+    parser.add_argument('--since', type=datetime.date.fromisoformat,
+                        help="Only discover posts published on or after this date (YYYY-MM-DD).")
+    parser.add_argument('--metrics-dir', default=METRICS_DIR,
+                        help="Where to write the run's metrics (JSON and Prometheus text).")
+    parser.add_argument('--profile', metavar='PATH', help="Write a cProfile dump of the crawl to PATH.")
+    parser.add_argument('--restart', action='store_true',
+                        help="Discard the checkpoint of an interrupted run instead of resuming it.")
+    parser.add_argument('--fuzzy', nargs='?', type=float, const=FUZZY_THRESHOLD, metavar='THRESHOLD',
+                        help=f"Also match keywords approximately, scoring at least THRESHOLD of 100 "
+                             f"(default {FUZZY_THRESHOLD}).")
+    parser.add_argument('--no-dedup', action='store_true',
+                        help="Do not cluster near-duplicate articles into the day's stories.csv.")
+    parser.add_argument('--no-incidence', action='store_true',
+                        help="Do not save the day's article x entity matrix or update the mention aggregates.")
+    parser.add_argument('--max-memory-mb', type=float, default=MAX_MEMORY / 2**20,
+                        help="Memory for the articles kept for stories and the incidence matrix "
+                             "before they spill to disk.")
+    parser.add_argument('--sentiment', action='store_true',
+                        help="Score the sentiment of matched articles (needs textblob).")
+    parser.add_argument('--sentiment-contexts', action='store_true',
+                        help="With --sentiment, also score the sentences around each entity mention.")
+    parser.add_argument('--sentiment-workers', type=int, default=SENTIMENT_WORKERS,
+                        help="Processes scoring sentiment.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running and poll each section on an interval adapted to how often it publishes.")
+    parser.add_argument('--min-interval', type=float, default=60.0,
+                        help="With --daemon, seconds between polls of the busiest sections.")
+    parser.add_argument('--max-interval', type=float, default=3600.0,
+                        help="With --daemon, seconds between polls of the quietest sections.")
+    parser.add_argument('--retries', type=int, default=RETRIES,
+                        help="Extra attempts for a failed request, with jittered exponential backoff.")
+    parser.add_argument('--http-cache', default=settings.HTTP_CACHE_DIR, metavar='DIR',
+                        help="Directory of the HTTP response cache.")
+    parser.add_argument('--no-http-cache', action='store_true', help="Download every page without the cache.")
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL / 3600,
+                        help="Hours a cached page is kept without being revalidated.")
+    parser.add_argument('--cache-max-mb', type=float, default=CACHE_MAX_BYTES / 2**20,
+                        help="Size of the HTTP cache before least recently used pages are evicted.")
+    parser.add_argument('--offline', action='store_true',
+                        help="Serve pages only from the HTTP cache, without network (use with --full to re-extract).")
+    parser.add_argument('--log-file', default=os.path.join(settings.LOG_DIR, 'crawl.log'), help="Log file.")
+    parser.add_argument('--log-level', default=settings.LOG_LEVEL,
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper, help="Log level.")
+    parser.add_argument('--log-format', default=settings.LOG_FORMAT, choices=['json', 'text'],
+                        help="JSON lines with structured fields, or plain text.")
+    args = parser.parse_args(argv)
+    if args.offline and args.no_http_cache:
+        parser.error("--offline needs the HTTP cache")
+    if args.daemon and (args.full or args.offline):
+        parser.error("--daemon polls for new articles and cannot be combined with --full or --offline")
+    if (args.sentiment or args.sentiment_contexts) and importlib.util.find_spec('textblob') is None:
+        parser.error("--sentiment needs textblob (pip install textblob)")
+
+    configure_logging(args.log_file, args.log_level, args.log_format)
+
+    limiter = HostRateLimiter(args.rate, HOST_BURST, HOST_RATES)
+    resilience = Resilience(retries=args.retries, limiter=limiter)
+    os.makedirs(settings.DATA_DIR, exist_ok=True)
+    seen = None
+    if not args.full:
+        seen = SeenStore(SEEN_DB)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+    if args.restart:
+        checkpoint.clear()
+    http_cache = None
+    if not args.no_http_cache:
+        http_cache = HttpCache(args.http_cache, ttl=args.cache_ttl * 3600,
+                               max_bytes=int(args.cache_max_mb * 2**20), offline=args.offline)
+    sentiment = None
+    if args.sentiment or args.sentiment_contexts:
+        sentiment = SentimentScorer(SentimentCache(SENTIMENT_CACHE), args.sentiment_workers,
+                                    contexts=args.sentiment_contexts)
+    bodies = None
+    if args.bodies:
+        bodies = BodyFetcher(BodyCache(BODY_CACHE), args.body_workers, limiter, http_cache=http_cache,
+                             resilience=resilience)
+    discovery = None
+    if not args.html_only:
+        discovery = FeedDiscovery(since=args.since, http_cache=http_cache, resilience=resilience)
+    try:
+        store = None
+        if not args.no_archive:
+            # pyarrow is only imported when archiving
+            from .store import ArticleStore
+            store = ArticleStore(ARCHIVE_DIR)
+        profiler = Profiler() if args.profile else None
+        if args.daemon:
+            # Imported here: the daemon module builds on this one
+            from .daemon import CrawlDaemon
+            daemon = CrawlDaemon(seen, args.sites, args.workers, limiter, max_pages=args.max_pages, store=store,
+                                 bodies=bodies, discovery=discovery, sites=sites, profiler=profiler,
+                                 http_cache=http_cache, fuzzy_threshold=args.fuzzy, dedup=not args.no_dedup,
+                                 incidence=not args.no_incidence, sentiment=sentiment, resilience=resilience,
+                                 min_interval=args.min_interval, max_interval=args.max_interval,
+                                 metrics_dir=args.metrics_dir, max_memory=int(args.max_memory_mb * 2**20))
+            signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+            try:
+                daemon.run()
+            except KeyboardInterrupt:
+                daemon.stop()
+            saved = {}
+        else:
+            saved = run_crawl(args.sites, args.workers, limiter, seen=seen, max_pages=args.max_pages,
+                              store=store, checkpoint=checkpoint, bodies=bodies, discovery=discovery, sites=sites,
+                              profiler=profiler, http_cache=http_cache, fuzzy_threshold=args.fuzzy,
+                              dedup=not args.no_dedup, sentiment=sentiment, resilience=resilience,
+                              incidence=not args.no_incidence, max_memory=int(args.max_memory_mb * 2**20))
+        json_path, prom_path = REGISTRY.write(args.metrics_dir)
+        logging.info("Metrics written to %s and %s.", json_path, prom_path)
+        if profiler is not None:
+            profiler.dump(args.profile)
+            logging.info("Profile written to %s.", args.profile)
+    finally:
+        if seen is not None:
+            seen.close()
+        if bodies is not None:
+            bodies.close()
+            bodies.cache.close()
+        if discovery is not None:
+            discovery.close()
+        if http_cache is not None:
+            http_cache.close()
+        if sentiment is not None:
+            sentiment.close()
+            sentiment.cache.close()
+    for name, output_file in saved.items():
+        print(f"{name}: results saved to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
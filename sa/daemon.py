@@ -0,0 +1,284 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import settings
+from .browser_pool import DriverPool
+from .crawl import (
+    BROWSER_POOL_SIZE,
+    BROWSER_RECYCLE_AFTER,
+    HOST_BURST,
+    HOST_RATE,
+    HOST_RATES,
+    MAX_WORKERS,
+    METRICS_DIR,
+    CrawlContext,
+    _section_task,
+    load_keywords,
+    open_incidence,
+    save_incidence,
+    section_name,
+    write_stories,
+)
+from .fetcher import WarmFetchers
+from .metrics import REGISTRY
+from .pipeline import CsvSink
+from .ratelimit import HostRateLimiter
+from .resilience import Resilience
+from .sentiment import SENTIMENT_FILE, SENTIMENT_HEADER
+from .sites import day_directory, load_sites
+
+# Daemon mode: one long-running process instead of a one-shot crawl per cron
+# tick. The keyword index, HTTP sessions, browser pool, caches and the
+# seen-article store stay open, so a poll only costs the pages that changed:
+# with the seen store a section's poll stops at the first page with nothing
+# new, usually page 1.
+#
+# Each section is polled on its own interval, adapted to how often it
+# publishes: its rate of new articles per second is smoothed over polls and
+# the next poll is planned for when about TARGET_NEW articles should have
+# appeared, between MIN_INTERVAL and MAX_INTERVAL. A section with nothing new
+# is polled less and less often; a busy one every minute.
+#
+# Output rolls over at midnight: in-flight polls finish, the day's CSVs,
+# stories, incidence matrix and metrics are closed and new ones opened under
+# scrapedata/YYYY/MM/DD. The keyword index is reloaded when keywords.json
+# changes.
+MIN_INTERVAL = 60.0  # Seconds
+MAX_INTERVAL = 3600.0
+INITIAL_INTERVAL = 300.0
+TARGET_NEW = 2  # New articles a poll should find on average
+SMOOTHING = 0.3  # Weight of the latest poll in a section's rate
+METRICS_INTERVAL = 300.0  # Seconds between metrics and incidence snapshots
+WAKE_INTERVAL = 1.0  # Longest sleep, so stop() and midnight are noticed
+
+
+class SectionPoll:
+    """Polling schedule of one section."""
+
+    def __init__(self, adapter, url, interval=INITIAL_INTERVAL, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.adapter = adapter
+        self.url = url
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate = None  # New articles per second, smoothed
+        self.last_poll = None
+        self.due = 0.0
+        self.polls = 0
+        self.fetchers = WarmFetchers()
+
+    @property
+    def name(self):
+        return f'{self.adapter.name}/{section_name(self.url)}'
+
+    def record(self, new_articles, started):
+        """Update the rate with a poll that began at `started` and plan the next."""
+        if self.last_poll is not None:
+            rate = new_articles / max(started - self.last_poll, 1e-6)
+            self.rate = rate if self.rate is None else SMOOTHING * rate + (1 - SMOOTHING) * self.rate
+            interval = TARGET_NEW / self.rate if self.rate else self.interval * 2
+            self.interval = min(self.max_interval, max(self.min_interval, interval))
+        self.last_poll = started
+        self.due = started + self.interval
+        self.polls += 1
+        logging.info("[%s] %s new articles; next poll in %.0fs.", self.adapter.name, new_articles, self.interval,
+                     extra={'section': section_name(self.url)})
+
+
+class CrawlDaemon:
+    """Polls every section of the selected sites until stopped.
+
+    Takes the same collaborators as crawl.run_crawl and keeps them open
+    across polls; `seen` (a SeenStore) is required, since a poll only
+    scrapes what is new. Each section keeps its listing fetchers, and their
+    HTTP sessions, open between polls; pooled browsers are handed back after
+    every poll.
+    """
+
+    def __init__(self, seen, site_names=None, max_workers=MAX_WORKERS, limiter=None, urls=None,
+                 pool_size=BROWSER_POOL_SIZE, max_pages=None, store=None, bodies=None, discovery=None, sites=None,
+                 profiler=None, http_cache=None, fuzzy_threshold=None, dedup=False, sentiment=None, resilience=None,
+                 incidence=False, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, metrics_dir=METRICS_DIR,
+                 max_memory=None):
+        self.seen = seen
+        self.max_workers = max_workers
+        self.limiter = limiter or HostRateLimiter(HOST_RATE, HOST_BURST, HOST_RATES)
+        self.resilience = resilience or Resilience(limiter=self.limiter)
+        self.max_pages = max_pages
+        self.store = store
+        self.bodies = bodies
+        self.discovery = discovery
+        self.profiler = profiler
+        self.http_cache = http_cache
+        self.fuzzy_threshold = fuzzy_threshold
+        self.dedup = dedup
+        self.incidence = incidence
+        self.max_memory = max_memory
+        self.sentiment = sentiment
+        self.metrics_dir = metrics_dir
+        sites = sites or load_sites()
+        self.adapters = [sites[name] for name in (site_names or sites)]
+        urls = urls or {}
+        self.sections = [
+            SectionPoll(adapter, url, max(min_interval, min(INITIAL_INTERVAL, max_interval)), min_interval,
+                        max_interval)
+            for adapter in self.adapters
+            for url in urls.get(adapter.name, adapter.urls)
+        ]
+        self.browsers = DriverPool(settings.CHROMEDRIVER_PATH, size=pool_size, recycle_after=BROWSER_RECYCLE_AFTER)
+        self.stopping = threading.Event()
+        self.index = None
+        self.keywords_mtime = None
+        self.day = None
+        self.sinks = {}
+        self.sentiment_sink = None
+        self.stories = None
+        self.mentions = None
+
+    def stop(self):
+        self.stopping.set()
+
+    def _reload_keywords(self):
+        try:
+            mtime = os.path.getmtime(settings.KEYWORDS_FILE)
+        except OSError as e:
+            if self.index is None:
+                logging.error("Cannot read keywords: %s", e)
+            return
+        if mtime == self.keywords_mtime:
+            return
+        index = load_keywords(self.fuzzy_threshold)
+        self.keywords_mtime = mtime
+        if index is None:
+            return
+        if self.index is not None:
+            logging.info("Reloaded keywords from %s.", settings.KEYWORDS_FILE)
+        self.index = index
+        if self.sentiment is not None and self.sentiment.contexts:
+            self.sentiment.index = index
+
+    def _open_day(self, day):
+        self.day = day
+        self.sinks = {adapter.name: CsvSink(adapter.output_path(day), adapter.csv_header) for adapter in self.adapters}
+        if self.sentiment is not None:
+            self.sentiment_sink = CsvSink(os.path.join(day_directory(day), SENTIMENT_FILE), SENTIMENT_HEADER)
+        self.stories = None
+        if self.dedup:
+            from .dedup import Deduplicator
+            self.stories = Deduplicator(max_bytes=self.max_memory)
+        self.mentions = open_incidence(day, self.max_memory) if self.incidence else None
+        logging.info("Writing to %s.", day_directory(day))
+
+    def _close_day(self):
+        for sink in self.sinks.values():
+            sink.close()
+        self.sinks = {}
+        if self.sentiment_sink is not None:
+            self.sentiment_sink.close()
+            self.sentiment_sink = None
+        if self.stories is not None:
+            if len(self.stories):
+                write_stories(self.stories, self.day)
+            self.stories.close()
+        self.stories = None
+        self._save_incidence()
+        if self.mentions is not None:
+            self.mentions.close()
+        self.mentions = None
+        self._write_metrics()
+
+    def _save_incidence(self):
+        if self.mentions is not None and len(self.mentions):
+            save_incidence(self.mentions)
+
+    def _write_metrics(self):
+        if self.metrics_dir:
+            REGISTRY.write(self.metrics_dir)
+
+    def _context(self):
+        # The day's sinks and tables and the current keyword index; no
+        # checkpoint, since a poll is short and the seen store skips what an
+        # interrupted one wrote
+        return CrawlContext(
+            self.index, self.limiter, self.sinks, browsers=self.browsers, seen=self.seen, max_pages=self.max_pages,
+            store=self.store, scraped_at=datetime.datetime.now(), bodies=self.bodies, discovery=self.discovery,
+            http_cache=self.http_cache, stories=self.stories, sentiment=self.sentiment,
+            sentiment_sink=self.sentiment_sink, resilience=self.resilience, incidence=self.mentions,
+        )
+
+    def _submit(self, workers, section):
+        return workers.submit(_section_task, self.profiler, section.adapter, section.url, self._context(),
+                              section.fetchers)
+
+    def _collect(self, done, running):
+        for future in done:
+            section, started = running.pop(future)
+            _, _, articles = future.result()
+            section.record(articles, started)
+
+    def run(self, duration=None):
+        """Poll until stop() is called, or for `duration` seconds."""
+        REGISTRY.reset()
+        self._reload_keywords()
+        if self.index is None:
+            return
+        logging.info("Polling %s sections.", len(self.sections))
+        started = time.monotonic()
+        metrics_due = started + METRICS_INTERVAL
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as workers:
+                while not self.stopping.is_set():
+                    now = time.monotonic()
+                    if duration is not None and now - started >= duration:
+                        break
+                    today = datetime.date.today()
+                    if today != self.day:
+                        if running:
+                            self._collect(wait(running).done, running)
+                        if self.day is not None:
+                            self._close_day()
+                        self._open_day(today)
+                    self._reload_keywords()
+
+                    busy = {section for section, _ in running.values()}
+                    for section in self.sections:
+                        if section not in busy and section.due <= now:
+                            running[self._submit(workers, section)] = (section, now)
+                            busy.add(section)
+
+                    if now >= metrics_due:
+                        self._save_incidence()
+                        self._write_metrics()
+                        metrics_due = now + METRICS_INTERVAL
+                    idle = [section.due for section in self.sections if section not in busy]
+                    timeout = min([WAKE_INTERVAL] + [max(0.0, due - time.monotonic()) for due in idle])
+                    if running:
+                        self._collect(wait(running, timeout=timeout, return_when=FIRST_COMPLETED).done, running)
+                    else:
+                        self.stopping.wait(timeout)
+                if running:
+                    self._collect(wait(running).done, running)
+        finally:
+            if self.day is not None:
+                self._close_day()
+                self.day = None
+            for section in self.sections:
+                section.fetchers.close()
+            if self.browsers.stats['created']:
+                logging.info("Browser pool metrics: %s", self.browsers.metrics())
+            self.browsers.close()
+            logging.info("Host health: %s", self.resilience.metrics())
+            logging.info("Poll schedule: %s", self.schedule())
+            logging.info("Stopped polling after %s polls.", sum(section.polls for section in self.sections))
+
+    def schedule(self):
+        """{section: (seconds between polls, new articles per hour)}."""
+        return {
+            section.name: (section.interval, section.rate * 3600 if section.rate is not None else None)
+            for section in self.sections
+        }
@@ -0,0 +1,191 @@
+import argparse
+import datetime
+import functools
+import re
+import timeit
+
+# The sites emit a handful of date formats, so those are parsed with
+# precompiled patterns; dateparser is only imported (slowly) and called for
+# anything else. Results are cached per raw string. Relative dates
+# ("2 hours ago") are cached as an offset and applied to the current time.
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'),
+        ('may',), ('june', 'jun'), ('july', 'jul'), ('august', 'aug'),
+        ('september', 'sep', 'sept'), ('october', 'oct'), ('november', 'nov'), ('december', 'dec'),
+    ], start=1)
+    for name in names
+}
+RELATIVE_UNITS = {
+    'second': datetime.timedelta(seconds=1),
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(weeks=1),
+}
+
+MONTH_DAY_YEAR_RE = re.compile(r'^([a-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})$')
+DAY_MONTH_YEAR_RE = re.compile(r'^(\d{1,2})\s+([a-z]+)\.?,?\s+(\d{4})$')
+ISO_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[t ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?(z|[+-]\d{2}:?\d{2})?)?$')
+RELATIVE_RE = re.compile(r'^(\d+|an?|one)\s+(second|minute|hour|day|week)s?\s+ago$')
+# BusinessWorld article URLs carry the publication date, e.g. /2024/11/27/637657/...
+URL_DATE_RE = re.compile(r'/(\d{4})/(\d{2})/(\d{2})/')
+
+CACHE_SIZE = 4096
+DATEPARSER_SETTINGS = {'TIMEZONE': 'UTC', 'TO_TIMEZONE': 'UTC'}
+
+
+def _date(year, month, day):
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso(m):
+    year, month, day, hour, minute, second, offset = m.groups()
+    if hour is None or offset is None or offset == 'z':
+        return _date(year, month, day)
+    sign = -1 if offset[0] == '-' else 1
+    offset = offset[1:].replace(':', '')
+    tz = datetime.timezone(sign * datetime.timedelta(hours=int(offset[:2]), minutes=int(offset[2:])))
+    try:
+        moment = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0), tzinfo=tz)
+    except ValueError:
+        return None
+    return moment.astimezone(datetime.timezone.utc).date()
+
+
+def fast_parse(text):
+    """Parse the formats the sites emit; returns a date, a timedelta (for
+    relative dates) or None when the text needs dateparser."""
+    text = ' '.join(text.lower().split())
+    m = ISO_RE.match(text)
+    if m:
+        return _iso(m)
+    m = MONTH_DAY_YEAR_RE.match(text)
+    if m and m.group(1) in MONTHS:
+        return _date(m.group(3), MONTHS[m.group(1)], m.group(2))
+    m = DAY_MONTH_YEAR_RE.match(text)
+    if m and m.group(2) in MONTHS:
+        return _date(m.group(3), MONTHS[m.group(2)], m.group(1))
+    m = RELATIVE_RE.match(text)
+    if m:
+        count = 1 if m.group(1) in ('a', 'an', 'one') else int(m.group(1))
+        return count * RELATIVE_UNITS[m.group(2)]
+    if text == 'today':
+        return datetime.timedelta(0)
+    if text == 'yesterday':
+        return datetime.timedelta(days=1)
+    return None
+
+
+def _dateparser_parse(text):
+    import dateparser
+    return dateparser.parse(text, settings=DATEPARSER_SETTINGS)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _parse_cached(text):
+    parsed = fast_parse(text)
+    if parsed is not None:
+        return parsed
+    parsed = _dateparser_parse(text)
+    return parsed.date() if parsed else None
+
+
+def parse_date(text, now=None):
+    """Return the date in `text` as a datetime.date, or None."""
+    if not text or not text.strip():
+        return None
+    parsed = _parse_cached(text.strip())
+    if isinstance(parsed, datetime.timedelta):
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return (now - parsed).date()
+    return parsed
+
+
+def date_from_url(url):
+    m = URL_DATE_RE.search(url or '')
+    return _date(*m.groups()) if m else None
+
+
+def published_date(article):
+    """Publication date of a listing card: from its URL, else its date text."""
+    return date_from_url(article.get('link')) or parse_date(article.get('date'))
+
+
+SAMPLES = [
+    'November 27, 2024',
+    'Nov 26, 2024',
+    '2024-11-27T08:15:00+08:00',
+    '2024-11-25',
+    '2 hours ago',
+    '3 days ago',
+]
+
+
+def distinct_samples(count):
+    """`count` different date strings in the formats of SAMPLES, so none
+    is served from the cache of an earlier one."""
+    texts = []
+    for i in range(count):
+        day = datetime.date(2024, 11, 27) - datetime.timedelta(days=i)
+        texts.append([
+            f"{day:%B} {day.day}, {day.year}",
+            f"{day:%b} {day.day}, {day.year}",
+            f"{day.isoformat()}T08:15:00+08:00",
+            day.isoformat(),
+            f"{i + 1} hours ago",
+            f"{i + 1} days ago",
+        ][i % len(SAMPLES)])
+    return texts
+
+
+def bench(repeat=5, articles=200):
+    """Time parsing `articles` dates per listing page, old per-article
+    dateparser call vs parse_date (cold and warm cache). The cold case parses
+    distinct strings; the warm one repeats SAMPLES, as listing pages do."""
+    texts = [SAMPLES[i % len(SAMPLES)] for i in range(articles)]
+    distinct = distinct_samples(articles)
+    _dateparser_parse(texts[0])  # Import and warm up dateparser outside the timings
+
+    def old():
+        for text in distinct:
+            _dateparser_parse(text)
+
+    def cold():
+        _parse_cached.cache_clear()
+        for text in distinct:
+            parse_date(text)
+
+    def warm():
+        for text in texts:
+            parse_date(text)
+
+    results = {}
+    for name, func in (('dateparser', old), ('parse_date (cold cache)', cold), ('parse_date (warm cache)', warm)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[name] = best / articles * 1e6
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse dates or benchmark the date parser.")
+    parser.add_argument('texts', nargs='*', help="Date strings or article URLs to parse.")
+    parser.add_argument('--bench', action='store_true', help="Compare parse_date with dateparser.")
+    parser.add_argument('--articles', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        results = bench(articles=args.articles)
+        baseline = results['dateparser']
+        for name, micros in results.items():
+            print(f"{name:<26}{micros:10.1f} us/article{baseline / micros:10.1f}x")
+    for text in args.texts:
+        print(f"{text} -> {date_from_url(text) or parse_date(text)}")
+
+
+if __name__ == "__main__":
+    main()
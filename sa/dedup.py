@@ -0,0 +1,198 @@
+import array
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from .records import ArticleTable
+
+# Near-duplicate stories across sections and sites, e.g. the same wire story
+# in several sections or a syndicated piece on two outlets. Each article gets
+# a MinHash signature of the word 3-grams of its title and body (or excerpt).
+# Signatures are split into bands; articles sharing any band land in the same
+# LSH bucket and only those pairs are compared, so clustering is roughly
+# linear in the number of articles. With 64 hashes in 16 bands of 4, pairs
+# whose Jaccard similarity is above ~0.5 are very likely to share a bucket.
+# Articles are kept in a records.ArticleTable, signatures in one uint32 array
+# and buckets as dicts keyed by a 64-bit hash of the band, holding a bare id
+# until a second cluster shares it, so a backfill of many thousand articles
+# stays small.
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 3  # Words per shingle
+THRESHOLD = 0.5  # Estimated Jaccard similarity for two articles to be one story
+STORIES_FILE = 'stories.csv'
+STORY_HEADER = ['Title', 'Link', 'Publication Date', 'Sources', 'Sections', 'Articles', 'Links', 'Entities', 'Keywords']
+
+_PRIME = (1 << 31) - 1
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def shingle_hashes(text):
+    words = _WORD_RE.findall((text or '').lower())
+    if len(words) < SHINGLE:
+        grams = {' '.join(words)} if words else set()
+    else:
+        grams = {' '.join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures from `num_perm` universal hash functions."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text):
+        """uint32 array of num_perm minimums, or None for empty text."""
+        hashes = shingle_hashes(text)
+        if not hashes.size:
+            return None
+        # a < 2**31 and the hashes < 2**32, so a * x + b fits in 64 bits
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+class Deduplicator:
+    """Clusters matched articles into stories as they are crawled.
+
+    add() is called from every crawl thread; stories() returns one canonical
+    article per cluster with the sources, sections, links and entities of all
+    its members. The same link matched for several entities is one article.
+    With `max_bytes` article titles and links beyond it are spilled to disk.
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, max_bytes=None):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.lock = threading.Lock()
+        self.buckets = [{} for _ in range(bands)]
+        self.parent = array.array('i')
+        self.signatures = np.zeros((1024, num_perm), dtype=np.uint32)
+        self.table = ArticleTable(max_bytes, fields=('title', 'link'))
+
+    def __len__(self):
+        return len(self.table)
+
+    def _find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, i, j):
+        root_i, root_j = self._find(i), self._find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    def _similarity(self, i, j):
+        return float((self.signatures[i] == self.signatures[j]).mean())
+
+    def _band_keys(self, signature):
+        # One 64-bit key per band, mixed from its `rows` hash values
+        rows = signature.reshape(self.bands, self.rows).astype(np.uint64)
+        keys = np.zeros(self.bands, dtype=np.uint64)
+        for r in range(self.rows):
+            keys = keys * _MIX + rows[:, r]
+        return keys.tolist()
+
+    def _insert(self, i, signature):
+        self.parent.append(i)
+        if signature is None:
+            return
+        if i >= len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+        self.signatures[i] = signature
+        compared = set()
+        for bucket, key in zip(self.buckets, self._band_keys(signature)):
+            members = bucket.get(key, ())
+            if isinstance(members, int):
+                members = [members]
+            for other in members:
+                # Once joined to a cluster, its other members need no comparison
+                if other not in compared and self._find(other) != self._find(i):
+                    compared.add(other)
+                    if self._similarity(i, other) >= self.threshold:
+                        self._union(i, other)
+            # A bucket keeps one member per cluster, so its size stays bounded
+            # by the number of distinct stories rather than articles
+            root = self._find(i)
+            if all(self._find(other) != root for other in members):
+                bucket[key] = members + [i] if members else i
+
+    def add(self, record, text):
+        """Add one matched record (source, section, entity, keyword, title, link)."""
+        with self.lock:
+            known = self.table.find(record['link']) is not None
+        signature = None if known else self.hasher.signature(text)
+        with self.lock:
+            i, new = self.table.add(record)
+            if new:
+                self._insert(i, signature)
+
+    def add_batch(self, batch):
+        """Add a pipeline Batch's records, using article bodies when fetched."""
+        articles = {article['link']: article for article in batch.articles}
+        for record in batch.records:
+            article = articles.get(record['link'], {})
+            text = f"{record['title']} {article.get('body') or record.get('excerpt') or ''}"
+            self.add(record, text)
+
+    def stories(self):
+        """One dict per cluster; the earliest published member is canonical."""
+        clusters = {}
+        with self.lock:
+            for i, article in enumerate(self.table):
+                cluster = clusters.get(self._find(i))
+                if cluster is None:
+                    cluster = clusters[self._find(i)] = {
+                        'canonical': article, 'sources': set(), 'sections': set(), 'links': [], 'entities': {},
+                    }
+                elif (article['published_at'] or '9999') < (cluster['canonical']['published_at'] or '9999'):
+                    cluster['canonical'] = article
+                if article['source']:
+                    cluster['sources'].add(article['source'])
+                if article['section']:
+                    cluster['sections'].add(article['section'])
+                cluster['links'].append(article['link'])
+                for entity, keyword in article['entities'].items():
+                    cluster['entities'].setdefault(entity, keyword)
+        stories = []
+        for cluster in clusters.values():
+            canonical = cluster['canonical']
+            stories.append({
+                'title': canonical['title'],
+                'link': canonical['link'],
+                'published_at': canonical['published_at'],
+                'sources': sorted(cluster['sources']),
+                'sections': sorted(cluster['sections']),
+                'articles': len(cluster['links']),
+                'links': cluster['links'],
+                'entities': list(cluster['entities']),
+                'keywords': list(cluster['entities'].values()),
+            })
+        return stories
+
+    def close(self):
+        self.table.close()
+
+
+def story_rows(stories):
+    for story in stories:
+        yield [
+            story['title'],
+            story['link'],
+            story['published_at'] or "Unknown",
+            '; '.join(story['sources']),
+            '; '.join(story['sections']),
+            story['articles'],
+            '; '.join(story['links']),
+            '; '.join(story['entities']),
+            '; '.join(story['keywords']),
+        ]
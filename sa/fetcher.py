@@ -0,0 +1,198 @@
+import logging
+import threading
+
+import lxml.html
+import requests
+
+from .metrics import count, timer
+from .resilience import http_get
+
+DEFAULT_HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/131.0 Safari/537.36'
+    ),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+}
+
+# Every fetcher returns a page object exposing the same three methods, so the
+# scrapers do not care whether the HTML came from requests or from Chrome:
+#   page.cards(selectors) -> [{'title', 'link', 'excerpt', 'date'}, ...]
+#   page.links(css)       -> [(text, href), ...]
+#   page.texts(css)       -> [text, ...]
+# `selectors` is the per-site dict with 'card', 'title' and optional
+# 'excerpt' and 'date' CSS selectors; missing fields come back as None.
+# Selenium is only imported once a site actually needs Chrome.
+
+
+def _clean(text):
+    return ' '.join(text.split()) if text else ''
+
+
+class HttpPage:
+
+    def __init__(self, url, html, encoding=None):
+        self.url = url
+        parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+        self.doc = lxml.html.document_fromstring(html, parser=parser, base_url=url)
+        self.doc.make_links_absolute(url)
+
+    @staticmethod
+    def _first_text(element, css):
+        if not css:
+            return None
+        found = element.cssselect(css)
+        return _clean(found[0].text_content()) if found else None
+
+    def cards(self, selectors):
+        cards = []
+        for card in self.doc.cssselect(selectors['card']):
+            title_elements = card.cssselect(selectors['title'])
+            if not title_elements:
+                logging.warning("Skipping article due to missing title element.")
+                continue
+            title_element = title_elements[0]
+            cards.append({
+                'title': _clean(title_element.text_content()),
+                'link': (title_element.get('href') or '').strip(),
+                'excerpt': self._first_text(card, selectors.get('excerpt')),
+                'date': self._first_text(card, selectors.get('date')),
+            })
+        return cards
+
+    def links(self, css):
+        return [(_clean(el.text_content()), el.get('href')) for el in self.doc.cssselect(css)]
+
+    def texts(self, css):
+        return [_clean(el.text_content()) for el in self.doc.cssselect(css)]
+
+
+class HttpFetcher:
+    """Plain HTTP fetcher; `http_cache` (an HttpCache) revalidates pages
+    fetched by earlier runs instead of downloading them again, and
+    `resilience` (a Resilience) adds adaptive timeouts, retries and the
+    per-host circuit breaker."""
+    engine = 'http'
+
+    def __init__(self, timeout=30, headers=None, http_cache=None, resilience=None):
+        self.timeout = timeout
+        self.http_cache = http_cache
+        self.resilience = resilience
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+
+    def fetch(self, url, wait_for=None):
+        with timer('http_get'):
+            response = http_get(self.session, url, self.timeout, self.http_cache, self.resilience)
+        response.raise_for_status()
+        # Only trust the declared charset; otherwise let lxml read <meta charset>
+        # instead of requests' ISO-8859-1 default, which garbles curly quotes.
+        content_type = response.headers.get('Content-Type', '').lower()
+        encoding = response.encoding if 'charset' in content_type else None
+        return HttpPage(response.url, response.content, encoding)
+
+    def release(self):
+        pass
+
+    def close(self):
+        self.session.close()
+
+
+class FallbackFetcher:
+    """Fetch over plain HTTP and re-fetch through Chrome only when needed.
+
+    A page falls back to Selenium when the HTTP response does not contain
+    the `wait_for` selector, e.g. because the listing is rendered client-side.
+    Chrome is started on the first fallback, not up front.
+    """
+    engine = 'http+selenium'
+
+    def __init__(self, chromedriver_path, timeout=40, headless=True, batch_extract=True, pool=None, http_cache=None,
+                 resilience=None):
+        self.http = HttpFetcher(timeout=timeout, http_cache=http_cache, resilience=resilience)
+        self.chromedriver_path = chromedriver_path
+        self.timeout = timeout
+        self.headless = headless
+        self.batch_extract = batch_extract
+        self.pool = pool
+        self.selenium = None
+
+    def fetch(self, url, wait_for=None):
+        # Only hold a pooled driver while a fallback page is in use.
+        self.release()
+        page = self.http.fetch(url)
+        if not wait_for or page.texts(wait_for):
+            return page
+        logging.info("No '%s' elements in HTTP response for %s; falling back to Selenium.", wait_for, url)
+        count('selenium_fallbacks')
+        if self.selenium is None:
+            from .selenium_fetcher import SeleniumFetcher
+            self.selenium = SeleniumFetcher(
+                self.chromedriver_path, self.timeout, self.headless, self.batch_extract, self.pool
+            )
+        return self.selenium.fetch(url, wait_for)
+
+    def release(self):
+        # Hand a fallback page's driver back to the pool; that page must not
+        # be used after this.
+        if self.selenium is not None:
+            self.selenium.release()
+
+    def close(self):
+        self.http.close()
+        if self.selenium is not None:
+            self.selenium.close()
+
+
+class WarmFetchers:
+    """Open fetchers of one section, kept between its crawls.
+
+    checkout(open_fetcher) hands out an idle fetcher, or a new one from
+    open_fetcher(); checkin() hands back its pooled browser, if any, and
+    keeps it idle with its HTTP session for the next checkout. Safe to use
+    from the workers of a parallel listing.
+    """
+
+    def __init__(self):
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def checkout(self, open_fetcher):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return open_fetcher()
+
+    def checkin(self, fetcher):
+        fetcher.release()
+        with self.lock:
+            self.idle.append(fetcher)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for fetcher in idle:
+            fetcher.close()
+
+
+def open_fetcher(site, chromedriver_path=None, timeout=40, headless=True, pool=None, http_cache=None,
+                 resilience=None):
+    """Create the fetcher configured for a site.
+
+    site['engine'] is 'http' (default) or 'selenium'; with 'http',
+    site['selenium_fallback'] enables the per-page Chrome fallback.
+    site['batch_extract'] (default True) makes Selenium pages extract all
+    cards with a single execute_script call. `pool` is an optional shared
+    DriverPool for the Selenium paths; `http_cache` (an HttpCache) and
+    `resilience` (a Resilience) are optional and shared by the HTTP paths.
+    """
+    engine = site.get('engine', 'http')
+    batch_extract = site.get('batch_extract', True)
+    if engine == 'selenium':
+        from .selenium_fetcher import SeleniumFetcher
+        return SeleniumFetcher(chromedriver_path, timeout, headless, batch_extract, pool)
+    if engine != 'http':
+        raise ValueError(f"Unknown fetch engine '{engine}' for site {site.get('name')}")
+    if site.get('selenium_fallback'):
+        return FallbackFetcher(chromedriver_path, timeout, headless, batch_extract, pool, http_cache, resilience)
+    return HttpFetcher(timeout=timeout, http_cache=http_cache, resilience=resilience)
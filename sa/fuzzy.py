@@ -0,0 +1,161 @@
+import difflib
+
+from .keyword_index import normalize_alias, normalize_text
+from .metrics import count
+
+# Fuzzy keyword matching on top of the exact KeywordIndex. Comparing every
+# alias with every stretch of an article is far too slow, so candidates are
+# blocked first:
+#   1. each article word is mapped to the alias words it resembles, through a
+#      character trigram index over the alias vocabulary (cached per word, so
+#      common words cost a dict lookup after the first article);
+#   2. an alias is a candidate where its first word resembles the article
+#      word and its last word resembles the word that ends the window;
+#   3. only those windows are scored, spaces and punctuation removed, with
+#      fuzzywuzzy's ratio (difflib when fuzzywuzzy is not installed). A
+#      window must start with the alias's first letter, so dropping a leading
+#      word ("philippines" for "v5 philippines") is not a near miss.
+# Multi-word aliases are also indexed in their joined form and adjacent
+# article words are tried joined, so "union bank" and "unionbank" meet.
+FUZZY_THRESHOLD = 90  # Window score (0-100) needed for a match
+TOKEN_THRESHOLD = 80  # Word score (0-100) for a word to resemble an alias word
+MIN_FUZZY_LENGTH = 5  # Aliases shorter than this (without spaces) only match exactly
+MIN_FUZZY_WORD = 4  # Words shorter than this only resemble identical words
+NGRAM = 3
+WORD_CACHE_SIZE = 200000
+
+
+def _difflib_ratio(a, b):
+    return round(100 * difflib.SequenceMatcher(None, a, b).ratio())
+
+
+def ratio_function():
+    """fuzzywuzzy's ratio, imported on first use, or a difflib equivalent."""
+    try:
+        from fuzzywuzzy import fuzz
+        return fuzz.ratio
+    except ImportError:
+        return _difflib_ratio
+
+
+def _grams(word):
+    return {word[i:i + NGRAM] for i in range(len(word) - NGRAM + 1)}
+
+
+class FuzzyIndex:
+    """Exact matches from a KeywordIndex plus fuzzy matches of the rest.
+
+    Exposes the same match() and find_all() as KeywordIndex, so it can be
+    passed wherever an index is expected.
+    """
+
+    def __init__(self, index, threshold=FUZZY_THRESHOLD, token_threshold=TOKEN_THRESHOLD):
+        self.index = index
+        self.entities = index.entities
+        self.threshold = threshold
+        self.token_threshold = token_threshold
+        self.ratio = ratio_function()
+        # forms: (entity, alias, words, joined words); indexed by first word
+        self.forms = []
+        self.by_first = {}
+        for entity, aliases in index.entities.items():
+            for alias in aliases:
+                words = tuple(normalize_alias(alias).split())
+                joined = ''.join(words)
+                if len(joined) < MIN_FUZZY_LENGTH:
+                    continue
+                variants = [words, (joined,)] if len(words) > 1 else [words]
+                for variant in variants:
+                    self.by_first.setdefault(variant[0], []).append(len(self.forms))
+                    self.forms.append((entity, alias, variant, joined))
+        self.vocabulary = {word for form in self.forms for word in form[2]}
+        self.grams = {}
+        for word in self.vocabulary:
+            if len(word) >= MIN_FUZZY_WORD:
+                for gram in _grams(word):
+                    self.grams.setdefault(gram, []).append(word)
+        self.similar_words = {}
+
+    @property
+    def alias_count(self):
+        return self.index.alias_count
+
+    def similar(self, word):
+        """Alias words that resemble `word` (including itself)."""
+        found = self.similar_words.get(word)
+        if found is not None:
+            return found
+        found = {word} if word in self.vocabulary else set()
+        if len(word) >= MIN_FUZZY_WORD:
+            grams = _grams(word)
+            shared = {}
+            for gram in grams:
+                for candidate in self.grams.get(gram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            # A word scoring >= token_threshold shares most of its trigrams
+            needed = len(grams) // 2
+            for candidate, hits in shared.items():
+                if hits >= needed and candidate not in found and self.ratio(word, candidate) >= self.token_threshold:
+                    found.add(candidate)
+        found = frozenset(found)
+        if len(self.similar_words) >= WORD_CACHE_SIZE:
+            self.similar_words.clear()
+        self.similar_words[word] = found
+        return found
+
+    def fuzzy_hits(self, words, skip=()):
+        """(first word, last word, entity, alias, score) of fuzzy hits in words."""
+        hits = []
+        n = len(words)
+        for i, word in enumerate(words):
+            starts = [(first, i) for first in self.similar(word)]
+            # "bank's" normalizes to "bank s"; do not read it as "banks"
+            if i + 1 < n and words[i + 1] != 's' and word + words[i + 1] in self.by_first:
+                starts.append((word + words[i + 1], i + 1))
+            best = {}
+            for first, start_end in starts:
+                for form_id in self.by_first.get(first, ()):
+                    entity, alias, form_words, joined = self.forms[form_id]
+                    if entity in skip:
+                        continue
+                    k = len(form_words)
+                    lengths = (k, k - 1, k + 1) if k > 1 else (1,)
+                    for length in lengths:
+                        j = start_end + length - 1
+                        if length < 1 or j >= n:
+                            continue
+                        if k > 1 and form_words[-1] not in self.similar(words[j]):
+                            continue
+                        window = ''.join(words[i:j + 1])
+                        if window[0] != joined[0]:
+                            continue
+                        # ratio() is at most 200 * shorter / (sum of lengths)
+                        shorter = min(len(window), len(joined))
+                        if 200 * shorter < self.threshold * (len(window) + len(joined)):
+                            continue
+                        score = self.ratio(window, joined)
+                        if score >= self.threshold and score > best.get(entity, (0,))[0]:
+                            best[entity] = (score, j, alias)
+            for entity, (score, j, alias) in best.items():
+                hits.append((i, j, entity, alias, score))
+        return hits
+
+    def find_all(self, text):
+        """Exact hits, then fuzzy hits of entities without an exact hit."""
+        norm, norm_starts, orig_starts = normalize_text(text)
+        hits = self.index.find_normalized(norm, norm_starts, orig_starts)
+        if not norm:
+            return hits
+        exact = {hit[2] for hit in hits}
+        words = norm.split(' ')
+        for first, last, entity, alias, score in self.fuzzy_hits(words, exact):
+            hits.append((orig_starts[first], orig_starts[last] + len(words[last]), entity, alias))
+            count('fuzzy_matches')
+        return hits
+
+    def match(self, text):
+        """Return {entity: alias}: exact matches first, then fuzzy ones."""
+        matched = {}
+        for _, _, entity, alias in self.find_all(text):
+            matched.setdefault(entity, alias)
+        return matched
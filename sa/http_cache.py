@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import settings
+from .metrics import count
+
+# Responses are kept on disk so repeated runs revalidate instead of
+# re-downloading. Bodies are content-addressed (objects/<sha256[:2]>/<sha256>),
+# so identical pages under different URLs are stored once; an SQLite index
+# maps each URL to its body, ETag and Last-Modified.
+#
+# A cached URL is served without a request while it is younger than
+# `fresh_for` (default 0: always revalidate), then revalidated with
+# If-None-Match / If-Modified-Since; a 304 costs no body. Entries not
+# revalidated within `ttl` are dropped, and once the cache is larger than
+# `max_bytes` the least recently used entries are evicted. With
+# `offline=True` only cached responses are served, whatever their age.
+CACHE_TTL = 7 * 24 * 3600
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+EVICT_EVERY = 200  # Stores between eviction passes
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a URL that is not cached."""
+
+
+class CachedResponse:
+    """The parts of a requests.Response the fetchers use, served from disk."""
+    status_code = 200
+
+    def __init__(self, url, content, content_type):
+        self.url = url
+        self.content = content
+        self.headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+        self.encoding = get_encoding_from_headers(self.headers)
+
+    def raise_for_status(self):
+        pass
+
+
+class HttpCache:
+
+    def __init__(self, directory, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, fresh_for=0, offline=False):
+        self.directory = directory
+        self.objects = os.path.join(directory, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' url TEXT PRIMARY KEY,'
+                ' final_url TEXT,'
+                ' digest TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' content_type TEXT,'
+                ' etag TEXT,'
+                ' last_modified TEXT,'
+                ' validated_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self.stores = 0
+        self.stats = {'hits': 0, 'not_modified': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+        count(f'http_cache_{name}')
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def _entry(self, url):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT final_url, digest, content_type, etag, last_modified, validated_at'
+                ' FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+
+    def _load(self, url, entry):
+        final_url, digest, content_type = entry[:3]
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+            return None
+        return CachedResponse(final_url, content, content_type)
+
+    def _touch(self, url, validated):
+        now = time.time()
+        with self.lock, self.conn:
+            if validated:
+                self.conn.execute('UPDATE responses SET validated_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            else:
+                self.conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+
+    def _store(self, url, response):
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, response.url, digest, len(content), response.headers.get('Content-Type'),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now),
+            )
+            self.stores += 1
+            evict = self.stores % EVICT_EVERY == 0
+        self._count('stored')
+        if evict:
+            self.evict()
+
+    def get(self, session, url, timeout=None):
+        """GET `url` through the cache; returns a Response or CachedResponse."""
+        entry = self._entry(url)
+        if entry is not None and self.offline:
+            cached = self._load(url, entry)
+            if cached is not None:
+                self._count('hits')
+                return cached
+        if self.offline:
+            self._count('misses')
+            raise CacheMiss(f"{url} is not in the HTTP cache and the crawl is offline")
+
+        now = time.time()
+        headers = {}
+        if entry is not None and now - entry[5] < self.ttl:
+            if now - entry[5] < self.fresh_for:
+                cached = self._load(url, entry)
+                if cached is not None:
+                    self._touch(url, validated=False)
+                    self._count('hits')
+                    return cached
+            if entry[3]:
+                headers['If-None-Match'] = entry[3]
+            if entry[4]:
+                headers['If-Modified-Since'] = entry[4]
+
+        response = session.get(url, timeout=timeout, headers=headers)
+        if response.status_code == 304 and headers:
+            cached = self._load(url, entry)
+            if cached is not None:
+                self._touch(url, validated=True)
+                self._count('not_modified')
+                return cached
+            # The body vanished from disk: fetch it again unconditionally
+            response = session.get(url, timeout=timeout)
+        self._count('misses')
+        if response.status_code == 200:
+            self._store(url, response)
+        return response
+
+    def evict(self):
+        """Drop entries past the TTL, then LRU entries until under max_bytes."""
+        cutoff = time.time() - self.ttl
+        with self.lock, self.conn:
+            evicted = self.conn.execute('DELETE FROM responses WHERE validated_at < ?', (cutoff,)).rowcount
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                for url, size in self.conn.execute('SELECT url, size FROM responses ORDER BY accessed_at').fetchall():
+                    self.conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+                    evicted += 1
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            referenced = {digest for (digest,) in self.conn.execute('SELECT DISTINCT digest FROM responses')}
+            self.stats['evicted'] += evicted
+        removed = 0
+        for prefix in os.listdir(self.objects):
+            for name in os.listdir(os.path.join(self.objects, prefix)):
+                if name not in referenced and not name.endswith('.tmp'):
+                    os.remove(os.path.join(self.objects, prefix, name))
+                    removed += 1
+        if evicted or removed:
+            logging.info("Evicted %s HTTP cache entries and %s bodies from %s.", evicted, removed, self.directory)
+
+    def size(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+
+    def close(self, evict=True):
+        """Close the index, evicting first unless offline or `evict` is False."""
+        if evict and not self.offline:
+            self.evict()
+        with self.lock:
+            stats = dict(self.stats)
+            self.conn.close()
+        logging.info("HTTP cache metrics: %s", stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sa.http_cache', description="Inspect or prune the HTTP cache.")
+    parser.add_argument('command', choices=['stats', 'evict', 'clear'])
+    parser.add_argument('--dir', default=settings.HTTP_CACHE_DIR, help="Cache directory.")
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL, help="Seconds an entry lives without revalidation.")
+    parser.add_argument('--max-mb', type=float, default=CACHE_MAX_BYTES / 2**20, help="Size limit in MiB.")
+    args = parser.parse_args(argv)
+
+    cache = HttpCache(args.dir, ttl=0 if args.command == 'clear' else args.ttl, max_bytes=int(args.max_mb * 2**20))
+    try:
+        if args.command != 'stats':
+            cache.evict()
+        entries, size = cache.size()
+        print(f"{entries} responses, {size / 2**20:.1f} MiB in {args.dir}")
+    finally:
+        # stats only reads; evict and clear have already evicted
+        cache.close(evict=False)
+
+
+if __name__ == "__main__":
+    main()
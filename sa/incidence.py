@@ -0,0 +1,315 @@
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from . import settings
+from .records import ArticleTable
+from .sites import day_directory
+
+# Which entities each matched article mentions, as one sparse article x
+# entity incidence matrix per day, saved next to the day's CSVs:
+#   scrapedata/YYYY/MM/DD/incidence.npz
+# holding the CSR indptr and indices (row i is the day's i-th article,
+# column j the entity with id j; every entry is 1) and the articles' links,
+# sources and publication dates. Entity ids are the same every day:
+# INCIDENCE_DIR/entities.json lists every entity ever matched in id order,
+# and new entities are appended.
+#
+# MentionAggregates folds the daily matrices into per-entity daily counts
+# (a dense days x entities array, the column sums of each day) and entity
+# co-occurrence (the upper triangle of M.T @ M, kept as (day, i, j, n)
+# arrays). update() only recomputes days whose matrix changed, so a query
+# over a year of data is a few array operations on one small file rather
+# than a rescan of the CSVs.
+INCIDENCE_FILE = 'incidence.npz'
+INCIDENCE_DIR = os.path.join(settings.DATA_DIR, 'incidence')
+ENTITIES_FILE = 'entities.json'
+AGGREGATES_FILE = 'aggregates.npz'
+
+
+def _write_npz(path, **arrays):
+    # Write then rename, so a reader never sees half a file
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+
+
+class EntityVocabulary:
+    """Stable integer ids of entity names, persisted as a JSON list."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.names = json.load(f)
+        except FileNotFoundError:
+            self.names = []
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.names)
+
+    def id(self, name):
+        with self.lock:
+            i = self.ids.get(name)
+            if i is None:
+                i = self.ids[name] = len(self.names)
+                self.names.append(name)
+                self.dirty = True
+            return i
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f'{self.path}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.names, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+
+def load_day(path):
+    """(CSR matrix, links, sources, publication dates) of a saved day."""
+    with np.load(path) as data:
+        indptr, indices = data['indptr'], data['indices']
+        matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                                   shape=(len(indptr) - 1, int(data['entities'])))
+        return matrix, data['links'].tolist(), data['sources'].tolist(), data['published'].tolist()
+
+
+class IncidenceBuilder:
+    """Collects one day's article x entity incidence as articles are matched.
+
+    add() is called from every crawl thread. The day's saved matrix, from an
+    earlier run that day, is loaded first, so save() writes the whole day.
+    Articles are kept in a records.ArticleTable, spilling links past
+    `max_bytes` to disk.
+    """
+
+    def __init__(self, vocabulary, day=None, max_bytes=None):
+        self.vocabulary = vocabulary
+        self.day = day or datetime.date.today()
+        self.path = os.path.join(day_directory(self.day), INCIDENCE_FILE)
+        self.lock = threading.Lock()
+        self.table = ArticleTable(max_bytes, fields=('link',), entities=vocabulary)
+        if os.path.exists(self.path):
+            matrix, links, sources, published = load_day(self.path)
+            rows = [self.table.add({'link': link, 'source': source, 'published_at': date})[0]
+                    for link, source, date in zip(links, sources, published)]
+            coo = matrix.tocoo()
+            for row, col in zip(coo.row.tolist(), coo.col.tolist()):
+                self.table.add_match(rows[row], vocabulary.names[col])
+
+    def __len__(self):
+        return len(self.table)
+
+    def add(self, records):
+        """Add matched records (dicts with entity, link, source, published_at)."""
+        with self.lock:
+            for record in records:
+                self.table.add(record)
+
+    def matrix(self):
+        with self.lock:
+            shape = (len(self.table), len(self.vocabulary))
+            rows, cols = self.table.matches()
+            matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=shape)
+        # An article matched twice for one entity (two sections) is one mention
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    def save(self):
+        """Write the day's matrix; returns its path."""
+        matrix = self.matrix()
+        # The ids in the matrix must be in entities.json before it is read
+        self.vocabulary.save()
+        with self.lock:
+            articles = [(a['link'], a['source'] or '', a['published_at'] or '') for a in self.table]
+        links, sources, published = zip(*articles) if articles else ((), (), ())
+        _write_npz(self.path, indptr=matrix.indptr, indices=matrix.indices, entities=matrix.shape[1],
+                   links=np.array(links, dtype=str), sources=np.array(sources, dtype=str),
+                   published=np.array(published, dtype=str))
+        logging.info("Saved incidence of %s articles x %s entities (%s mentions) to %s.", matrix.shape[0],
+                     matrix.shape[1], matrix.nnz, self.path)
+        return self.path
+
+    def close(self):
+        self.table.close()
+
+
+class MentionAggregates:
+    """Per-entity daily mention counts and co-occurrence, updated incrementally.
+
+    Counts are articles mentioning an entity per crawl day; co-occurrence is
+    articles mentioning both entities of a pair. Queries take optional
+    `since`/`until` dates (inclusive).
+    """
+
+    def __init__(self, directory=INCIDENCE_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, AGGREGATES_FILE)
+        self.vocabulary = EntityVocabulary(os.path.join(directory, ENTITIES_FILE))
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self.days = data['days'].astype('datetime64[D]')
+                self.mtimes = data['mtimes']
+                self.articles = data['articles']
+                self.counts = data['counts']
+                self.pair_day = data['pair_day'].astype('datetime64[D]')
+                self.pair_i = data['pair_i']
+                self.pair_j = data['pair_j']
+                self.pair_n = data['pair_n']
+        else:
+            self.days = np.empty(0, dtype='datetime64[D]')
+            self.mtimes = np.empty(0, dtype=np.float64)
+            self.articles = np.empty(0, dtype=np.int32)
+            self.counts = np.zeros((0, 0), dtype=np.int32)
+            self.pair_day = np.empty(0, dtype='datetime64[D]')
+            self.pair_i = np.empty(0, dtype=np.int32)
+            self.pair_j = np.empty(0, dtype=np.int32)
+            self.pair_n = np.empty(0, dtype=np.int32)
+        self._widen(len(self.vocabulary))
+
+    def _widen(self, entities):
+        if self.counts.shape[1] < entities:
+            self.counts = np.pad(self.counts, ((0, 0), (0, entities - self.counts.shape[1])))
+
+    def add_day(self, day, matrix, mtime=0.0):
+        """Replace the aggregates of `day` with those of its incidence matrix."""
+        day = np.datetime64(day, 'D')
+        self._widen(matrix.shape[1])
+        row = np.zeros(self.counts.shape[1], dtype=np.int32)
+        row[:matrix.shape[1]] = np.asarray(matrix.sum(axis=0)).ravel()
+        pairs = sparse.triu(matrix.T @ matrix, k=1).tocoo()
+
+        k = int(np.searchsorted(self.days, day))
+        if k < len(self.days) and self.days[k] == day:
+            self.counts[k] = row
+            self.mtimes[k] = mtime
+            self.articles[k] = matrix.shape[0]
+            keep = self.pair_day != day
+            self.pair_day, self.pair_i = self.pair_day[keep], self.pair_i[keep]
+            self.pair_j, self.pair_n = self.pair_j[keep], self.pair_n[keep]
+        else:
+            self.days = np.insert(self.days, k, day)
+            self.mtimes = np.insert(self.mtimes, k, mtime)
+            self.articles = np.insert(self.articles, k, matrix.shape[0])
+            self.counts = np.insert(self.counts, k, row, axis=0)
+        self.pair_day = np.concatenate([self.pair_day, np.full(pairs.nnz, day)])
+        self.pair_i = np.concatenate([self.pair_i, pairs.row.astype(np.int32)])
+        self.pair_j = np.concatenate([self.pair_j, pairs.col.astype(np.int32)])
+        self.pair_n = np.concatenate([self.pair_n, pairs.data.astype(np.int32)])
+
+    def update(self, root=None):
+        """Fold in every day whose incidence matrix changed; returns those days."""
+        self.vocabulary = EntityVocabulary(self.vocabulary.path)
+        self._widen(len(self.vocabulary))
+        known = dict(zip(self.days.tolist(), self.mtimes.tolist()))
+        digits = '[0-9]'
+        pattern = os.path.join(root or settings.DATA_DIR, digits * 4, digits * 2, digits * 2, INCIDENCE_FILE)
+        updated = []
+        for path in sorted(glob.glob(pattern)):
+            year, month, day = path.split(os.sep)[-4:-1]
+            day = datetime.date(int(year), int(month), int(day))
+            mtime = os.path.getmtime(path)
+            if known.get(day) == mtime:
+                continue
+            self.add_day(day, load_day(path)[0], mtime)
+            updated.append(day)
+        if updated:
+            self.save()
+            logging.info("Updated mention aggregates for %s days.", len(updated))
+        return updated
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_npz(self.path, days=self.days.astype(np.int64), mtimes=self.mtimes, articles=self.articles,
+                   counts=self.counts, pair_day=self.pair_day.astype(np.int64), pair_i=self.pair_i,
+                   pair_j=self.pair_j, pair_n=self.pair_n)
+
+    @staticmethod
+    def _mask(days, since=None, until=None):
+        mask = np.ones(len(days), dtype=bool)
+        if since is not None:
+            mask &= days >= np.datetime64(since, 'D')
+        if until is not None:
+            mask &= days <= np.datetime64(until, 'D')
+        return mask
+
+    def daily_counts(self, entity, since=None, until=None):
+        """(days, mention counts) of one entity."""
+        mask = self._mask(self.days, since, until)
+        j = self.vocabulary.ids.get(entity)
+        if j is None:
+            return self.days[mask], np.zeros(int(mask.sum()), dtype=np.int32)
+        return self.days[mask], self.counts[mask, j]
+
+    def totals(self, since=None, until=None, n=None):
+        """[(entity, mentions)] over the window, most mentioned first."""
+        sums = self.counts[self._mask(self.days, since, until)].sum(axis=0)
+        order = np.argsort(-sums, kind='stable')[:n]
+        return [(self.vocabulary.names[j], int(sums[j])) for j in order if sums[j]]
+
+    def cooccurrence(self, since=None, until=None):
+        """Symmetric entities x entities CSR matrix of articles mentioning both."""
+        mask = self._mask(self.pair_day, since, until)
+        size = self.counts.shape[1]
+        upper = sparse.csr_matrix((self.pair_n[mask], (self.pair_i[mask], self.pair_j[mask])), shape=(size, size))
+        return upper + upper.T
+
+    def co_mentions(self, entity, since=None, until=None, n=None):
+        """[(entity, articles mentioning both)] for one entity, most first."""
+        j = self.vocabulary.ids.get(entity)
+        if j is None:
+            return []
+        mask = self._mask(self.pair_day, since, until) & ((self.pair_i == j) | (self.pair_j == j))
+        others = np.where(self.pair_i[mask] == j, self.pair_j[mask], self.pair_i[mask])
+        sums = np.bincount(others, weights=self.pair_n[mask], minlength=self.counts.shape[1])
+        order = np.argsort(-sums, kind='stable')[:n]
+        return [(self.vocabulary.names[k], int(sums[k])) for k in order if sums[k]]
+
+
+def main(argv=None):
+    """Update the mention aggregates and query them."""
+    parser = argparse.ArgumentParser(prog='python -m sa.incidence', description="Entity mention counts.")
+    parser.add_argument('command', choices=['update', 'top', 'daily', 'co'])
+    parser.add_argument('entity', nargs='?', help="Entity for 'daily' and 'co'.")
+    parser.add_argument('--days', type=int, default=30, help="Look this many days back.")
+    parser.add_argument('-n', type=int, default=20, help="Entities to list.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command in ('daily', 'co') and not args.entity:
+        parser.error(f"'{args.command}' needs an entity")
+
+    aggregates = MentionAggregates()
+    updated = aggregates.update()
+    if args.command == 'update':
+        print(f"Updated {len(updated)} days; {len(aggregates.days)} days of {len(aggregates.vocabulary)} entities.")
+        return
+    since = datetime.date.today() - datetime.timedelta(days=args.days)
+    if args.command == 'top':
+        rows = aggregates.totals(since, n=args.n)
+    elif args.command == 'co':
+        rows = aggregates.co_mentions(args.entity, since, n=args.n)
+    else:
+        days, counts = aggregates.daily_counts(args.entity, since)
+        rows = [(str(day), int(n)) for day, n in zip(days, counts)]
+    for name, value in rows:
+        print(f"{value:6d}  {name}")
+
+
+if __name__ == "__main__":
+    main()
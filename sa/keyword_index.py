@@ -0,0 +1,223 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+
+from .matcher import KeywordMatcher
+
+# Bump whenever normalization or the pickled layout changes so stale
+# index files are rebuilt even if keywords.json itself did not change.
+INDEX_VERSION = 2
+
+CORPORATE_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company',
+    'ltd', 'limited', 'pte', 'llc', 'plc',
+}
+
+# Words skipped when checking whether a parenthetical is the name's acronym,
+# e.g. "bank for international settlements (bis)".
+_ACRONYM_STOPWORDS = {'of', 'the', 'and', 'for', 'ng', 'do', 'de', 'on'}
+
+_WORD_RE = re.compile(r'[^\W_]+')
+_PAREN_RE = re.compile(r'\(([^)]*)\)')
+
+
+def normalize_text(text):
+    """Lowercase text and collapse punctuation/whitespace runs to one space.
+
+    Returns the normalized string together with the start offset of every
+    word in the normalized and in the original text, so hits can be mapped
+    back onto the original.
+    """
+    words, norm_starts, orig_starts = [], [], []
+    pos = 0
+    for m in _WORD_RE.finditer(text):
+        word = m.group().lower()
+        if len(word) != m.end() - m.start():
+            word = m.group()
+        words.append(word)
+        norm_starts.append(pos)
+        orig_starts.append(m.start())
+        pos += len(word) + 1
+    return ' '.join(words), norm_starts, orig_starts
+
+
+def normalize_alias(alias):
+    words = _WORD_RE.findall(alias.lower())
+    while len(words) > 1 and words[-1] in CORPORATE_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def split_aliases(entry):
+    """Split one keywords.json entry into its individual aliases.
+
+    "a; b; c" groups are split on semicolons. A parenthetical "(formerly: x)"
+    or an acronym of the name, as in "anti-money laundering (aml)", becomes an
+    extra alias; other parentheticals such as "(a thrift bank)" or "(ph)" are
+    qualifiers and are dropped.
+    """
+    aliases = []
+    for part in entry.split(';'):
+        extra = []
+        outer = _PAREN_RE.sub(' ', part)
+        words = normalize_alias(outer).split()
+        initials = {
+            ''.join(w[0] for w in words),
+            ''.join(w[0] for w in words if w not in _ACRONYM_STOPWORDS),
+        }
+        for inner in _PAREN_RE.findall(part):
+            inner = inner.strip()
+            if inner.lower().startswith('formerly'):
+                extra.append(inner[len('formerly'):].lstrip(' :'))
+            elif inner.lower() in initials:
+                extra.append(inner)
+        part = re.sub(r'\s+,', ',', ' '.join(outer.split())).strip(' ,')
+        for alias in [part] + extra:
+            if alias and alias not in aliases:
+                aliases.append(alias)
+    return aliases
+
+
+class KeywordIndex:
+
+    def __init__(self, entities):
+        # entities: canonical entity -> list of raw aliases
+        self.entities = entities
+        self.matcher = KeywordMatcher()
+        for entity, aliases in entities.items():
+            seen = set()
+            for alias in aliases:
+                norm = normalize_alias(alias)
+                if norm and norm not in seen:
+                    seen.add(norm)
+                    self.matcher.add(norm, (entity, alias))
+        self.matcher.compile()
+
+    @property
+    def alias_count(self):
+        return self.matcher.size
+
+    def find_all(self, text):
+        """Return every (start, end, entity, alias) hit, offsets into text."""
+        return self.find_normalized(*normalize_text(text))
+
+    def find_normalized(self, norm, norm_starts, orig_starts):
+        """find_all() for text already passed through normalize_text()."""
+        hits = []
+        for start, end, (entity, alias) in self.matcher.find_all(norm):
+            first = bisect.bisect_right(norm_starts, start) - 1
+            last = bisect.bisect_right(norm_starts, end - 1) - 1
+            orig_start = orig_starts[first] + (start - norm_starts[first])
+            orig_end = orig_starts[last] + (end - norm_starts[last])
+            hits.append((orig_start, orig_end, entity, alias))
+        return hits
+
+    def match(self, text):
+        """Return {entity: first matched alias} for text, in order of first hit."""
+        matched = {}
+        for _, _, entity, alias in self.find_all(text):
+            matched.setdefault(entity, alias)
+        return matched
+
+
+def build_index(keywords):
+    """Group keyword entries into canonical entities.
+
+    Entries that share any normalized alias are merged, so
+    "2c2p philippines, inc." and "2c2p; 2c2p ph; 2c2p philippines" become one
+    entity. The canonical name is the first alias of the first entry seen.
+    """
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    groups = []
+    for entry in keywords:
+        aliases = split_aliases(entry)
+        norms = [n for n in (normalize_alias(a) for a in aliases) if n]
+        if not norms:
+            continue
+        groups.append(aliases)
+        for norm in norms:
+            parent.setdefault(norm, norm)
+            root_a, root_b = find(norms[0]), find(norm)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    entities = {}
+    canonical_by_root = {}
+    for aliases in groups:
+        root = find(next(n for n in (normalize_alias(a) for a in aliases) if n))
+        canonical = canonical_by_root.setdefault(root, aliases[0])
+        merged = entities.setdefault(canonical, [])
+        for alias in aliases:
+            if alias not in merged:
+                merged.append(alias)
+    return KeywordIndex(entities)
+
+
+def index_path_for(json_file):
+    return os.path.splitext(json_file)[0] + '.idx'
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_index(json_file, index_file=None):
+    """Load the compiled keyword index, rebuilding it if keywords.json changed."""
+    if not os.path.exists(json_file):
+        logging.error("Keywords file '%s' does not exist.", json_file)
+        return None
+
+    index_file = index_file or index_path_for(json_file)
+    source_hash = _file_hash(json_file)
+
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('version') == INDEX_VERSION and cached.get('source_hash') == source_hash:
+                index = cached['index']
+                logging.info("Loaded keyword index with %s entities from %s.", len(index.entities), index_file)
+                return index
+            logging.info("Keyword index %s is stale; rebuilding.", index_file)
+        except Exception as e:
+            logging.warning("Could not read keyword index %s, rebuilding: %s", index_file, e)
+
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            keywords = json.load(f)
+    except Exception as e:
+        logging.error("Error loading keywords from JSON: %s", e)
+        return None
+
+    if not isinstance(keywords, list) or not all(isinstance(kw, str) for kw in keywords):
+        logging.error("Invalid JSON format: Keywords should be a list of strings.")
+        return None
+
+    index = build_index(keywords)
+    logging.info("Built keyword index: %s entries, %s entities, %s aliases.", len(keywords), len(index.entities),
+                 index.alias_count)
+
+    try:
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(
+                {'version': INDEX_VERSION, 'source_hash': source_hash, 'index': index},
+                f, protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_file, index_file)
+    except Exception as e:
+        logging.warning("Could not write keyword index %s: %s", index_file, e)
+
+    return index
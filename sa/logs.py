@@ -0,0 +1,119 @@
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from .metrics import REGISTRY
+
+# Log records are put on a queue by the crawl threads and formatted and
+# written by a single background thread, so a slow disk or a burst of match
+# logs never blocks scraping. Structured fields are passed with `extra=`:
+#   logging.info("Found %s articles.", n, extra={'section': s, 'page': 2, 'stage': 'extract'})
+# and the current site is filled in from metrics.site_context(), the section
+# from log_context().
+FIELDS = ('site', 'section', 'page', 'article', 'stage', 'duration')
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(threadName)s - %(message)s'
+
+_context = threading.local()
+_listener = None
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach fields to every record logged by this thread inside the block."""
+    previous = getattr(_context, 'fields', {})
+    _context.fields = dict(previous, **fields)
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+def current_context():
+    """This thread's log_context() fields, to carry over to helper threads."""
+    return dict(getattr(_context, 'fields', {}))
+
+
+class ContextFilter(logging.Filter):
+    """Adds the emitting thread's context to records; runs before they are queued."""
+
+    def filter(self, record):
+        if getattr(record, 'site', None) is None:
+            record.site = REGISTRY._site() or None
+        for field, value in getattr(_context, 'fields', {}).items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the structured fields that are set."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        # The stock handler formats the message here, on the crawl thread.
+        # Records are only read by our own listener, so pass them through and
+        # let the listener thread do the formatting.
+        return record
+
+
+def configure_logging(path, level=logging.INFO, fmt='json'):
+    """Send the root logger through a background writer to `path` (UTF-8).
+
+    `fmt` is 'json' (one object per line) or 'text'. Calling it again
+    replaces the previous setup; stop_logging() (also run at exit) flushes
+    pending records.
+    """
+    global _listener
+    stop_logging()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = logging.FileHandler(path, mode='a', encoding='utf-8')
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging():
+    """Write out queued records and stop the background writer."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
@@ -0,0 +1,112 @@
+from collections import deque
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    The keywords are compiled once; each call to find_all() is a single pass
+    over the text, independent of how many keywords were loaded.
+    """
+
+    def __init__(self, keywords=()):
+        # Node i is described by _goto[i] (char -> node), _fail[i] and _own[i],
+        # the list of (pattern length, value) pairs ending at that node.
+        # compile() fills _out[i] with the outputs of its whole failure chain.
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [[]]
+        self._out = [[]]
+        self._compiled = False
+        self.size = 0
+        for keyword in keywords:
+            self.add(keyword)
+        self.compile()
+
+    def add(self, pattern, value=None):
+        pattern = pattern.strip().lower()
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            node = nxt
+        entry = (len(pattern), pattern if value is None else value)
+        if entry not in self._own[node]:
+            self._own[node].append(entry)
+            self.size += 1
+        self._compiled = False
+
+    def compile(self):
+        # Breadth-first pass to fill in failure links and merge the outputs
+        # of each node's failure chain into the node itself. The merged lists
+        # are rebuilt from each node's own outputs, so add() may follow.
+        self._out = [list(own) for own in self._own]
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._own[nxt] + self._out[self._fail[nxt]]
+        self._compiled = True
+
+    def find_all(self, text, word_boundaries=True):
+        """Return every (start, end, value) hit in text, in order of end offset."""
+        if not self._compiled:
+            self.compile()
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few characters expand when lowercased; fall back to a per-char
+            # lowering so offsets still line up with the original text.
+            lowered = ''.join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            for length, value in out[node]:
+                start = end - length
+                if word_boundaries and not self._on_boundary(lowered, start, end):
+                    continue
+                hits.append((start, end, value))
+        return hits
+
+    @staticmethod
+    def _on_boundary(text, start, end):
+        # Only enforce a boundary where the keyword itself starts or ends with
+        # a word character, so "alipay+" or "(aml)" still match as written.
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def matched_keywords(self, text, word_boundaries=True):
+        """Return the distinct values found in text, in order of first hit."""
+        seen = {}
+        for _, _, value in self.find_all(text, word_boundaries):
+            seen.setdefault(value, None)
+        return list(seen)
+
@@ -0,0 +1,164 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+# Process-wide timers and counters. Stages are timed with
+#   with timer('fetch'):
+#       ...
+# and events counted with count('pages'). Samples are labelled with the site
+# set by site_context() on the current thread, so every layer below the crawl
+# (fetchers, pool, matcher) is attributed without passing the site around.
+# Gauges (gauge('browser_pool_size', 2)) hold the last value set and describe
+# shared resources, so they carry no site.
+PREFIX = 'sa'
+
+
+class Metrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def _site(self):
+        return getattr(self.local, 'site', None) or ''
+
+    @contextlib.contextmanager
+    def site_context(self, site):
+        previous = getattr(self.local, 'site', None)
+        self.local.site = site
+        try:
+            yield
+        finally:
+            self.local.site = previous
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        key = (stage, self._site())
+        with self.lock:
+            calls, total, longest = self.stages.get(key, (0, 0.0, 0.0))
+            self.stages[key] = (calls + 1, total + seconds, max(longest, seconds))
+
+    def count(self, name, amount=1):
+        key = (name, self._site())
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'duration_seconds': time.time() - self.started,
+                'stages': [
+                    {'stage': stage, 'site': site, 'calls': calls, 'seconds': total, 'max_seconds': longest}
+                    for (stage, site), (calls, total, longest) in sorted(self.stages.items())
+                ],
+                'counters': [
+                    {'name': name, 'site': site, 'value': value}
+                    for (name, site), value in sorted(self.counters.items())
+                ],
+                'gauges': dict(sorted(self.gauges.items())),
+            }
+
+    def summary(self):
+        """Seconds per stage summed over sites, largest first."""
+        totals = {}
+        for row in self.snapshot()['stages']:
+            totals[row['stage']] = totals.get(row['stage'], 0.0) + row['seconds']
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                rendered = ','.join(f'{k}="{v}"' for k, v in labels.items() if v)
+                value = repr(float(value)) if isinstance(value, float) else value
+                lines.append(f'{PREFIX}_{name}{{{rendered}}} {value}' if rendered else f'{PREFIX}_{name} {value}')
+
+        stages = snapshot['stages']
+        family('stage_seconds_total', 'counter', 'Time spent in each crawl stage.',
+               [({'stage': r['stage'], 'site': r['site']}, r['seconds']) for r in stages])
+        family('stage_calls_total', 'counter', 'Number of times each crawl stage ran.',
+               [({'stage': r['stage'], 'site': r['site']}, r['calls']) for r in stages])
+        family('stage_seconds_max', 'gauge', 'Longest single run of each crawl stage.',
+               [({'stage': r['stage'], 'site': r['site']}, r['max_seconds']) for r in stages])
+        for name in sorted({r['name'] for r in snapshot['counters']}):
+            family(f'{name}_total', 'counter', f'Crawl {name.replace("_", " ")}.',
+                   [({'site': r['site']}, r['value']) for r in snapshot['counters'] if r['name'] == name])
+        for name, value in snapshot['gauges'].items():
+            family(name, 'gauge', f'Current {name.replace("_", " ")}.', [({}, value)])
+        family('run_duration_seconds', 'gauge', 'Wall-clock duration of the crawl.',
+               [({}, snapshot['duration_seconds'])])
+        family('run_started_timestamp_seconds', 'gauge', 'Unix time the crawl started.',
+               [({}, snapshot['started'])])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory):
+        """Write <time>.json and latest.prom into directory; return their paths."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+        json_path = os.path.join(directory, f'metrics-{stamp}.json')
+        prom_path = os.path.join(directory, 'latest.prom')
+        for path, content in ((json_path, json.dumps(self.snapshot(), indent=2)), (prom_path, self.prometheus())):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return json_path, prom_path
+
+
+class Profiler:
+    """cProfile across threads: each call to run() is profiled on its own
+    thread and dump() merges all of them into one pstats file."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = []
+
+    def run(self, func, *args, **kwargs):
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def dump(self, path):
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(path)
+        return stats
+
+
+REGISTRY = Metrics()
+timer = REGISTRY.timer
+count = REGISTRY.count
+gauge = REGISTRY.gauge
+site_context = REGISTRY.site_context
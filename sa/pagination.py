@@ -0,0 +1,41 @@
+import re
+
+# Numbered WordPress listings link to their pages directly, e.g.
+#   <a class="page-numbers" href="https://businessmirror.com.ph/business/page/2/">2</a>
+#   ...
+#   <a class="page-numbers" href="https://businessmirror.com.ph/business/page/812/">812</a>
+# so after the first page every other page URL is known up front and pages
+# can be fetched in parallel instead of following "Next" one at a time.
+PAGE_PATH_RE = re.compile(r'^(?P<prefix>.*?/page/)(?P<number>\d+)(?P<suffix>/?(?:[?#].*)?)$')
+
+
+class PagePlan:
+    """Direct URLs of a numbered listing: url(n) for n up to `last`."""
+
+    def __init__(self, prefix, suffix, last):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.last = last
+
+    def url(self, number):
+        return f'{self.prefix}{number}{self.suffix}'
+
+    @classmethod
+    def from_page(cls, page, container):
+        """Plan from a listing page's pagination links, or None.
+
+        `last` is the highest page number linked; None when no numbers are
+        shown (the crawl then stops at max_pages or the first empty page).
+        """
+        prefix = suffix = None
+        last = None
+        for text, href in page.links(f'{container} a'):
+            m = PAGE_PATH_RE.match(href or '')
+            if not m:
+                continue
+            prefix, suffix = m.group('prefix'), m.group('suffix')
+            numbers = [int(n) for n in (m.group('number'), text.replace(',', '')) if n.isdigit()]
+            last = max([last or 0] + numbers)
+        if prefix is None:
+            return None
+        return cls(prefix, suffix, last)
@@ -0,0 +1,385 @@
+import csv
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .logs import current_context, log_context
+from .metrics import count, site_context, timer
+from .sentiment import sentiment_rows
+
+# A section crawl is a chain of generator stages, one page at a time:
+#
+#   fetch_pages -> extract_articles [-> fetch_bodies] -> match_articles
+#       [-> score_sentiment] [-> collect_stories] [-> collect_incidence] -> write_batches
+#
+# fetch_feed_pages replaces fetch_pages when a section is discovered through
+# wp-json or RSS instead of its HTML listing pages, and fetch_pages_parallel
+# when a numbered listing's page URLs can be planned up front. collect_stories feeds the
+# run-wide near-duplicate clustering and collect_incidence the day's article x
+# entity matrix.
+#
+# Only the current page is held in memory, so memory stays flat however
+# many pages are crawled. write_batches flushes every page to disk, marks its
+# articles as seen and then records a checkpoint, so an interrupted run can
+# resume from the next page.
+
+FSYNC_INTERVAL = 5.0  # Seconds between fsyncs of a CSV sink
+
+
+class Batch:
+    """One listing page as it moves through the pipeline."""
+
+    def __init__(self, page_number, url, next_url, articles):
+        self.page_number = page_number
+        self.url = url
+        self.next_url = next_url
+        self.articles = articles
+        self.results = None
+        self.records = []
+
+
+def _load_page(fetcher, limiter, url, page_number, site, stopped=None):
+    with timer('rate_limit_wait'):
+        limiter.acquire(url)
+    if stopped is not None and stopped.is_set():
+        return None, []
+    logging.info("[%s] Scraping page %s: %s", site['name'], page_number + 1, url,
+                 extra={'page': page_number + 1, 'stage': 'fetch'})
+    started = time.perf_counter()
+    with timer('fetch'):
+        page = fetcher.fetch(url, wait_for=site['selectors']['card'])
+    with timer('extract'):
+        articles = page.cards(site['selectors'])
+    logging.info("[%s] Found %s articles on the current page.", site['name'], len(articles),
+                 extra={'page': page_number + 1, 'stage': 'extract', 'duration': time.perf_counter() - started})
+    return page, articles
+
+
+def fetch_pages(fetcher, limiter, start_url, first_page, max_pages, site, next_page_url):
+    current_url = start_url
+    page_number = first_page
+    while current_url and page_number < max_pages:
+        page, articles = _load_page(fetcher, limiter, current_url, page_number, site)
+        with timer('paginate'):
+            next_url = next_page_url(page)
+        count('pages')
+        count('articles', len(articles))
+        yield Batch(page_number, current_url, next_url, articles)
+        current_url = next_url
+        page_number += 1
+
+
+def fetch_pages_parallel(open_page_fetcher, limiter, start_url, first_page, max_pages, site, plan_pages, workers,
+                         close_page_fetcher=None):
+    """fetch_pages for numbered listings, fetching pages concurrently.
+
+    The first page's pagination links give every page URL (a PagePlan from
+    `plan_pages`), so the following pages are requested `workers` at a time,
+    each through the per-host rate limiter, and yielded in page order. The
+    listing ends at max_pages, the last linked page, a 404 or an empty page.
+    At most `workers` pages are fetched ahead until the consumer has taken
+    the first of them, then 2 * `workers`; when the consumer stops, queued
+    pages are cancelled and pages still waiting for the rate limiter are
+    skipped. `open_page_fetcher()` opens one fetcher per worker thread and
+    `close_page_fetcher(fetcher)` (default: fetcher.close()) disposes of
+    them when the listing is done. Each fetcher
+    hands back its pooled browser, if any, once a page's cards are read, so
+    idle workers never hold the browsers busy ones wait for.
+    """
+    local = threading.local()
+    fetchers = []
+    lock = threading.Lock()
+    stopped = threading.Event()
+    context = current_context()
+
+    def load(url, page_number, keep_page=False):
+        fetcher = getattr(local, 'fetcher', None)
+        if fetcher is None:
+            fetcher = local.fetcher = open_page_fetcher()
+            with lock:
+                fetchers.append(fetcher)
+        # Label the worker thread's metrics and logs like the section's own
+        with site_context(site['name']), log_context(**context):
+            try:
+                return _load_page(fetcher, limiter, url, page_number, site, stopped)
+            finally:
+                if not keep_page:
+                    fetcher.release()
+
+    pool = None
+    pending = deque()
+    try:
+        # The first page stays usable until its pagination links are read
+        page, articles = load(start_url, first_page, keep_page=True)
+        with timer('paginate'):
+            plan = plan_pages(page)
+        local.fetcher.release()
+        limit = max_pages
+        # A listing shows its last page number only when there is more than
+        # one page ahead; otherwise the highest link is just the next page
+        if plan is not None and plan.last and plan.last > first_page + 2:
+            limit = min(limit, plan.last)
+
+        def page_url(page_number):
+            return plan.url(page_number + 1) if plan is not None and page_number < limit else None
+
+        count('pages')
+        count('articles', len(articles))
+        yield Batch(first_page, start_url, page_url(first_page + 1), articles)
+        if plan is None:
+            return
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{site['name']}-pages")
+        next_number = first_page + 1
+        # A seen-filtered crawl often stops at the first page or two of
+        # prefetched ones, so only a full round of workers goes out until
+        # the consumer asks for more
+        ahead = workers
+        while True:
+            while next_number < limit and len(pending) < ahead:
+                pending.append((next_number, pool.submit(load, page_url(next_number), next_number)))
+                next_number += 1
+            if not pending:
+                return
+            page_number, future = pending.popleft()
+            try:
+                _, articles = future.result()
+            except Exception as e:
+                if getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+                    logging.info("[%s] Listing ends before page %s.", site['name'], page_number + 1,
+                                 extra={'page': page_number + 1, 'stage': 'paginate'})
+                    return
+                raise
+            if not articles:
+                return
+            count('pages')
+            count('articles', len(articles))
+            yield Batch(page_number, page_url(page_number), page_url(page_number + 1), articles)
+            ahead = 2 * workers
+    finally:
+        stopped.set()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for fetcher in fetchers:
+            if close_page_fetcher is not None:
+                close_page_fetcher(fetcher)
+            else:
+                fetcher.close()
+
+
+def fetch_feed_pages(discovery, limiter, start_url, first_page, max_pages, site):
+    current_url = start_url
+    page_number = first_page
+    while current_url and page_number < max_pages:
+        logging.info("[%s] Discovering page %s: %s", site['name'], page_number + 1, current_url,
+                     extra={'page': page_number + 1, 'stage': 'discover'})
+        started = time.perf_counter()
+        with timer('discover'):
+            articles, next_url = discovery.fetch(current_url, limiter)
+        logging.info("[%s] Found %s articles in the feed.", site['name'], len(articles),
+                     extra={'page': page_number + 1, 'stage': 'discover', 'duration': time.perf_counter() - started})
+        count('pages')
+        count('articles', len(articles))
+        yield Batch(page_number, current_url, next_url, articles)
+        current_url = next_url
+        page_number += 1
+
+
+def extract_articles(batches, site, seen=None):
+    for batch in batches:
+        if seen is not None:
+            with timer('seen_filter'):
+                fresh = seen.filter_new(batch.articles, site['name'])
+            if batch.articles and not fresh:
+                logging.info("[%s] Only already-seen articles on this page; stopping.", site['name'],
+                             extra={'page': batch.page_number + 1, 'stage': 'seen_filter'})
+                # Stop the fetch stage now, cancelling any pages it fetches ahead
+                batches.close()
+                return
+            batch.articles = fresh
+        yield batch
+
+
+def fetch_bodies(batches, bodies, site):
+    for batch in batches:
+        with timer('bodies'):
+            bodies.fill(batch.articles, site)
+        yield batch
+
+
+def match_articles(batches, adapter, index, section):
+    for batch in batches:
+        with timer('match'):
+            batch.results = adapter.scrape_articles(batch.articles, index)
+            for record in adapter.iter_records(batch.results):
+                record.update(source=adapter.name, section=section)
+                batch.records.append(record)
+        count('matches', len(batch.records))
+        yield batch
+
+
+def score_sentiment(batches, scorer, sink=None):
+    for batch in batches:
+        if batch.records:
+            with timer('sentiment'):
+                scorer.score_records(batch.records, {article['link']: article for article in batch.articles})
+            if sink is not None:
+                sink.write(sentiment_rows(batch.records))
+        yield batch
+
+
+def collect_stories(batches, dedup):
+    for batch in batches:
+        with timer('dedup'):
+            dedup.add_batch(batch)
+        yield batch
+
+
+def collect_incidence(batches, incidence):
+    for batch in batches:
+        if batch.records:
+            with timer('incidence'):
+                incidence.add(batch.records)
+        yield batch
+
+
+def write_batches(batches, adapter, sink, key, checkpoint=None, seen=None, store=None, scraped_at=None):
+    """Consume the pipeline: write each page, then mark it seen and checkpoint it.
+
+    Returns (pages, articles) written.
+    """
+    pages = articles = 0
+    for batch in batches:
+        with timer('write_csv'):
+            sink.write(adapter.csv_rows(batch.results))
+        if store is not None and batch.records:
+            with timer('archive'):
+                store.append(batch.records, scraped_at)
+        if seen is not None:
+            with timer('seen_update'):
+                seen.add(batch.articles, adapter.name)
+        if checkpoint is not None:
+            with timer('checkpoint'):
+                checkpoint.update(key, batch.next_url, batch.page_number + 1)
+        pages += 1
+        articles += len(batch.articles)
+    if checkpoint is not None:
+        checkpoint.finish(key)
+    return pages, articles
+
+
+class CsvSink:
+    """Thread-safe CSV appender that flushes every write and fsyncs periodically."""
+
+    def __init__(self, path, header, append=True, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        write_header = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.rows = 0
+        self.last_sync = time.monotonic()
+        if write_header:
+            self.writer.writerow(header)
+            self.file.flush()
+
+    def write(self, rows):
+        with self.lock:
+            before = self.rows
+            for row in rows:
+                self.writer.writerow(row)
+                self.rows += 1
+            if self.rows == before:
+                return
+            self.file.flush()
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                os.fsync(self.file.fileno())
+                self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+        logging.info("Results saved to %s (%s rows).", self.path, self.rows)
+
+
+class Checkpoint:
+    """Per-section progress (next page URL and pages done) of one crawl day,
+    persisted as JSON.
+
+    The file only exists while a crawl is in progress or was interrupted;
+    clear() removes it once every section has returned, finished or failed.
+    A checkpoint left by another day's run is ignored. A section that failed
+    is retried from its last written page when an interrupted run resumes.
+    """
+
+    def __init__(self, path, day=None):
+        self.path = path
+        self.day = (day or datetime.date.today()).isoformat()
+        self.lock = threading.Lock()
+        self.sections = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except Exception as e:
+                logging.warning("Ignoring unreadable checkpoint %s: %s", path, e)
+            else:
+                if state.get('day') == self.day:
+                    self.sections = state.get('sections', {})
+                    logging.info("Resuming from checkpoint %s.", path)
+                else:
+                    logging.info("Ignoring checkpoint %s of an interrupted run on %s.", path, state.get('day'))
+
+    @property
+    def resuming(self):
+        return bool(self.sections)
+
+    def resume_point(self, key, start_url):
+        """Return (url, pages already done) for a section, or None if it finished."""
+        with self.lock:
+            state = self.sections.get(key)
+        if state is None:
+            return start_url, 0
+        if state.get('done'):
+            return None
+        if not state.get('next_url'):
+            return (start_url, 0) if state.get('failed') else None
+        return state['next_url'], state['pages']
+
+    def update(self, key, next_url, pages):
+        with self.lock:
+            self.sections[key] = {'next_url': next_url, 'pages': pages, 'done': False}
+            self._save()
+
+    def finish(self, key):
+        with self.lock:
+            state = self.sections.setdefault(key, {'next_url': None, 'pages': 0})
+            state['done'] = True
+            self._save()
+
+    def fail(self, key):
+        """Record that a section stopped on an error; it is not finished."""
+        with self.lock:
+            state = self.sections.setdefault(key, {'next_url': None, 'pages': 0, 'done': False})
+            state['failed'] = True
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'day': self.day, 'sections': self.sections}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self.lock:
+            self.sections = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,225 @@
+import array
+import bisect
+import datetime
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .metrics import count
+from .seen_store import article_key
+
+# Compact storage of matched articles for long crawls and backfills. A dict
+# per (article, entity) match repeats every field for every entity and costs
+# a few hundred bytes of object overhead each; an ArticleTable stores each
+# article once:
+#   - sources, sections, entities and keywords are interned to small ids;
+#   - text fields are UTF-8 in one bytearray per field plus an array of end
+#     offsets, and the publication date is a day number;
+#   - matches are parallel (article, entity, keyword) id arrays.
+# With `max_bytes` the text of the current chunk of articles is spilled to an
+# .npz file in a temporary directory once it passes the limit. Ids, dates,
+# matches and a sorted 8-byte hash per spilled link stay in memory, about
+# 40 bytes per article plus 12 per match.
+TEXT_FIELDS = ('title', 'link', 'excerpt')
+INDEX_ENTRY_BYTES = 100  # Estimated cost of one entry in the current chunk's link index
+
+
+def link_hash(link):
+    digest = hashlib.blake2b(article_key(link).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _day_number(value):
+    # Days since 0001-01-01; 0 when unknown
+    if not value:
+        return 0
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    try:
+        return datetime.date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+class Interner:
+    """Small integer ids for repeated strings, e.g. sources and entities."""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def id(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+
+class ArticleTable:
+    """Matched articles stored once, with their matches as id arrays.
+
+    add(record) stores a record's article the first time its link is seen
+    (by seen_store.article_key) and its entity every time; article ids are
+    consecutive from 0. `fields` are the text fields kept. `entities` may be
+    shared, e.g. an incidence.EntityVocabulary for stable ids. Not
+    thread-safe: callers hold their own lock.
+    """
+
+    def __init__(self, max_bytes=None, fields=TEXT_FIELDS, entities=None, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.fields = fields
+        self.spill_dir = spill_dir
+        self.directory = None
+        self.sources = Interner()
+        self.sections = Interner()
+        self.entities = entities if entities is not None else Interner()
+        self.keywords = Interner()
+        self.source = array.array('i')
+        self.section = array.array('i')
+        self.published = array.array('i')
+        self.match_article = array.array('i')
+        self.match_entity = array.array('i')
+        self.match_keyword = array.array('i')
+        self.spilled = []  # (first id, path, sorted link hashes, their offsets in the chunk)
+        self.cached = None  # (first id, text) of the last spilled chunk read
+        self._new_chunk(0)
+
+    def _new_chunk(self, start):
+        self.chunk_start = start
+        self.index = {}
+        self.text = {field: bytearray() for field in self.fields}
+        self.ends = {field: array.array('q') for field in self.fields}
+
+    def __len__(self):
+        return len(self.source)
+
+    @property
+    def nbytes(self):
+        """Approximate memory of the current chunk's text and link index."""
+        articles = len(self) - self.chunk_start
+        text = sum(len(blob) for blob in self.text.values())
+        return text + 8 * len(self.fields) * articles + INDEX_ENTRY_BYTES * len(self.index)
+
+    def _find(self, h):
+        i = self.index.get(h)
+        if i is not None:
+            return i
+        key = np.uint64(h)
+        for start, _, hashes, offsets in self.spilled:
+            k = int(np.searchsorted(hashes, key))
+            if k < len(hashes) and hashes[k] == key:
+                return start + int(offsets[k])
+        return None
+
+    def find(self, link):
+        """Id of the article at link, or None."""
+        return self._find(link_hash(link))
+
+    def add(self, record):
+        """Store the record's article if new, and its match; returns (id, new)."""
+        h = link_hash(record['link'])
+        i = self._find(h)
+        new = i is None
+        if new:
+            i = self.index[h] = len(self)
+            self.source.append(self.sources.id(record.get('source') or ''))
+            self.section.append(self.sections.id(record.get('section') or ''))
+            self.published.append(_day_number(record.get('published_at')))
+            for field in self.fields:
+                self.text[field] += (record.get(field) or '').encode('utf-8')
+                self.ends[field].append(len(self.text[field]))
+        if record.get('entity') is not None:
+            self.add_match(i, record['entity'], record.get('keyword'))
+        if new and self.max_bytes is not None and self.nbytes >= self.max_bytes:
+            self.spill()
+        return i, new
+
+    def add_match(self, i, entity, keyword=None):
+        self.match_article.append(i)
+        self.match_entity.append(self.entities.id(entity))
+        self.match_keyword.append(self.keywords.id(keyword or ''))
+
+    def matches(self):
+        """(article ids, entity ids) of every match, as arrays."""
+        return np.array(self.match_article, dtype=np.int32), np.array(self.match_entity, dtype=np.int32)
+
+    def spill(self):
+        """Move the text of the current chunk to disk."""
+        articles = len(self) - self.chunk_start
+        if not articles:
+            return
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='sa-records-', dir=self.spill_dir)
+        path = os.path.join(self.directory, f'chunk-{len(self.spilled)}.npz')
+        arrays = {}
+        for field in self.fields:
+            arrays[field] = np.array(self.text[field], dtype=np.uint8)
+            arrays[f'{field}_ends'] = np.array(self.ends[field], dtype=np.int64)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+        hashes = np.fromiter(self.index.keys(), dtype=np.uint64, count=len(self.index))
+        offsets = np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index)) - self.chunk_start
+        order = np.argsort(hashes)
+        self.spilled.append((self.chunk_start, path, hashes[order], offsets[order].astype(np.int32)))
+        count('records_spilled', articles)
+        logging.debug("Spilled %s articles to %s.", articles, path)
+        self._new_chunk(len(self))
+
+    def _chunk(self, i):
+        # (first id, {field: (blob, ends)}) of the chunk holding article i
+        if i >= self.chunk_start:
+            return self.chunk_start, {field: (self.text[field], self.ends[field]) for field in self.fields}
+        k = bisect.bisect_right([chunk[0] for chunk in self.spilled], i) - 1
+        start, path = self.spilled[k][:2]
+        if self.cached is None or self.cached[0] != start:
+            with np.load(path) as data:
+                text = {field: (data[field].tobytes(), data[f'{field}_ends']) for field in self.fields}
+            self.cached = (start, text)
+        return self.cached
+
+    def _article(self, i, matches):
+        start, text = self._chunk(i)
+        j = i - start
+        article = {}
+        for field in self.fields:
+            blob, ends = text[field]
+            article[field] = blob[ends[j - 1] if j else 0:ends[j]].decode('utf-8') or None
+        day = self.published[i]
+        article.update(
+            source=self.sources.names[self.source[i]] or None,
+            section=self.sections.names[self.section[i]] or None,
+            published_at=datetime.date.fromordinal(day).isoformat() if day else None,
+            entities={},
+        )
+        # The first keyword of a repeated match wins
+        for k in matches:
+            entity = self.entities.names[self.match_entity[k]]
+            article['entities'].setdefault(entity, self.keywords.names[self.match_keyword[k]] or None)
+        return article
+
+    def get(self, i):
+        """Article i as a dict of its fields, source, section, published_at
+        and {entity: keyword} matches."""
+        return self._article(i, np.flatnonzero(np.array(self.match_article, dtype=np.int32) == i))
+
+    def __iter__(self):
+        """Every article as get() returns it, in id order."""
+        articles = np.array(self.match_article, dtype=np.int64)
+        order = np.argsort(articles, kind='stable')
+        bounds = np.searchsorted(articles[order], np.arange(len(self) + 1))
+        for i in range(len(self)):
+            yield self._article(i, order[bounds[i]:bounds[i + 1]].tolist())
+
+    def close(self):
+        """Delete the spilled chunks."""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
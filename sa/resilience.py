@@ -0,0 +1,215 @@
+import collections
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from .metrics import count
+
+# Every HTTP request goes through a per-host health record:
+#   - the timeout adapts to the host's recent latency: TIMEOUT_FACTOR times
+#     its 95th percentile, between MIN_TIMEOUT and the site's own timeout;
+#   - connection errors, timeouts, truncated or undecodable bodies and
+#     429/5xx answers are retried up to RETRIES times with full-jitter
+#     exponential backoff;
+#   - after FAILURE_THRESHOLD consecutive failures the host's circuit opens
+#     and its requests fail at once with HostUnavailable for a cool-down,
+#     after which a single probe request decides whether it closes again.
+#     Each failed probe doubles the cool-down, up to MAX_COOLDOWN.
+# So a failing site is shed within a few requests while the others carry on.
+RETRIES = 2  # Extra attempts after the first
+BACKOFF = 0.5  # Seconds; attempt n waits up to BACKOFF * 2**n
+MAX_BACKOFF = 10.0
+TIMEOUT_FACTOR = 4
+MIN_TIMEOUT = 5.0
+LATENCY_SAMPLES = 100
+MIN_SAMPLES = 5  # Samples before the timeout adapts
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+MAX_COOLDOWN = 600.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Transport errors that count against a host and are retried; anything else
+# raised while sending propagates at once
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ContentDecodingError)
+
+
+class HostUnavailable(Exception):
+    """Raised instead of requesting a host whose circuit is open."""
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class HostHealth:
+    """Latency samples and circuit state of one host."""
+
+    def __init__(self, host, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probing = False
+
+    def percentile(self, fraction):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def timeout(self, default):
+        if len(self.latencies) < MIN_SAMPLES:
+            return default
+        adaptive = max(MIN_TIMEOUT, TIMEOUT_FACTOR * self.percentile(0.95))
+        return min(default, adaptive) if default else adaptive
+
+    def allow(self):
+        """Whether a request may go out now; claims the probe when half-open."""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a claimed probe without judging the host."""
+        with self.lock:
+            self.probing = False
+
+    def retry_in(self):
+        with self.lock:
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def success(self, seconds=None):
+        with self.lock:
+            if seconds is not None:
+                self.latencies.append(seconds)
+            if self.state != 'closed':
+                logging.info("Circuit for %s closed again.", self.host)
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+            self.cooldown = self.base_cooldown
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open':
+                self.cooldown = min(MAX_COOLDOWN, self.cooldown * 2)
+            elif self.state != 'closed' or self.failures < self.failure_threshold:
+                return
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.probing = False
+            cooldown = self.cooldown
+        count('circuit_opened')
+        logging.warning("Circuit for %s opened after %s failures; pausing it for %.0fs.", self.host,
+                        self.failures, cooldown)
+
+
+class Resilience:
+    """Shared retry, timeout and circuit-breaker policy for all HTTP fetches.
+
+    Retries take a token from `limiter` (a HostRateLimiter) when given, like
+    the first attempt did.
+    """
+
+    def __init__(self, retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, limiter=None, seed=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.limiter = limiter
+        self.random = random.Random(seed)
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def health(self, url):
+        host = host_of(url)
+        with self.lock:
+            health = self.hosts.get(host)
+            if health is None:
+                health = self.hosts[host] = HostHealth(host, self.failure_threshold, self.cooldown)
+            return health
+
+    def _delay(self, attempt):
+        with self.lock:
+            return self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, url, send, timeout=None):
+        """Call send(timeout) -> response for `url` under the policy.
+
+        Returns the response (a final 429/5xx one included, for the caller's
+        raise_for_status) or raises the last connection error, or
+        HostUnavailable while the host's circuit is open.
+        """
+        health = self.health(url)
+        error = None
+        for attempt in range(self.retries + 1):
+            if not health.allow():
+                count('circuit_rejected')
+                raise HostUnavailable(f"{health.host} is failing; not requesting {url} "
+                                      f"for another {health.retry_in():.0f}s")
+            if attempt:
+                time.sleep(self._delay(attempt - 1))
+                if self.limiter is not None:
+                    self.limiter.acquire(url)
+                count('retries')
+            try:
+                response = send(health.timeout(timeout))
+            except RETRY_ERRORS as e:
+                error = e
+                health.failure()
+                logging.warning("Attempt %s for %s failed: %s", attempt + 1, url, e)
+                continue
+            except BaseException:
+                # E.g. TooManyRedirects or a bug in send: a half-open host
+                # must not keep an unanswered probe forever
+                health.release()
+                raise
+            if response.status_code in RETRY_STATUSES:
+                health.failure()
+                logging.warning("Attempt %s for %s answered %s.", attempt + 1, url, response.status_code)
+                if attempt == self.retries:
+                    return response
+                continue
+            # Cached responses carry no timing and do not count as samples
+            elapsed = getattr(response, 'elapsed', None)
+            health.success(elapsed.total_seconds() if elapsed is not None else None)
+            return response
+        raise error
+
+    def metrics(self):
+        with self.lock:
+            hosts = dict(self.hosts)
+        return {
+            host: {'state': health.state, 'p95_seconds': health.percentile(0.95), 'timeout': health.timeout(None)}
+            for host, health in hosts.items()
+        }
+
+
+def http_get(session, url, timeout, http_cache=None, resilience=None):
+    """GET url through the HTTP cache and the resilience policy, when given."""
+    def send(timeout):
+        if http_cache is not None:
+            return http_cache.get(session, url, timeout)
+        return session.get(url, timeout=timeout)
+    if resilience is None:
+        return send(timeout)
+    return resilience.request(url, send, timeout)
@@ -0,0 +1,83 @@
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+# BusinessWorld article URLs carry a numeric post ID after the date,
+# e.g. /banking-finance/2024/11/27/637657/fed-cites-.../
+ARTICLE_ID_RE = re.compile(r'/\d{4}/\d{2}/\d{2}/(\d+)(?:/|$)')
+
+
+def article_key(url):
+    """Stable key for an article URL: host plus post ID when the URL has one,
+    otherwise host plus path without query string or trailing slash."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    m = ARTICLE_ID_RE.search(parts.path)
+    if m:
+        return f"{host}:{m.group(1)}"
+    return f"{host}:{parts.path.rstrip('/')}"
+
+
+class SeenStore:
+    """Persistent set of already-scraped article keys per source, backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS seen ('
+                ' source TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' link TEXT,'
+                ' first_seen TEXT,'
+                ' PRIMARY KEY (source, key))'
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def is_seen(self, url, source):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT 1 FROM seen WHERE source = ? AND key = ?', (source, article_key(url))
+            ).fetchone()
+        return row is not None
+
+    def filter_new(self, articles, source):
+        """Return the articles (dicts with a 'link') not yet stored for source."""
+        keys = [article_key(article['link']) for article in articles]
+        if not keys:
+            return []
+        with self.lock:
+            placeholders = ','.join('?' * len(keys))
+            seen = {
+                row[0] for row in self.conn.execute(
+                    f'SELECT key FROM seen WHERE source = ? AND key IN ({placeholders})',
+                    [source] + keys,
+                )
+            }
+        new, batch = [], set()
+        for key, article in zip(keys, articles):
+            if key not in seen and key not in batch:
+                batch.add(key)
+                new.append(article)
+        return new
+
+    def add(self, articles, source):
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        rows = [(source, article_key(a['link']), a['link'], now) for a in articles]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+        logging.info("Closed seen-article store %s.", self.path)
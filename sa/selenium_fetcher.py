@@ -0,0 +1,157 @@
+import json
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import (
+    TimeoutException,
+    NoSuchElementException,
+    WebDriverException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from .browser_pool import DriverPool
+from .metrics import count, timer
+
+# Extracts every card in one WebDriver round trip instead of several
+# find_element/.text/get_attribute calls per card. Mirrors the per-element
+# path: innerText ~ WebElement.text, a.href ~ get_attribute('href').
+EXTRACT_CARDS_JS = """
+var sel = arguments[0];
+function text(root, css) {
+    if (!css) { return null; }
+    var el = root.querySelector(css);
+    return el ? (el.innerText || '').trim() : null;
+}
+var cards = [];
+var skipped = 0;
+document.querySelectorAll(sel.card).forEach(function (card) {
+    var title = card.querySelector(sel.title);
+    if (!title) { skipped++; return; }
+    cards.push({
+        title: (title.innerText || '').trim(),
+        link: (title.href || title.getAttribute('href') || '').trim(),
+        excerpt: text(card, sel.excerpt),
+        date: text(card, sel.date)
+    });
+});
+return JSON.stringify({cards: cards, skipped: skipped});
+"""
+
+
+class SeleniumPage:
+
+    def __init__(self, driver, batch_extract=True):
+        self.driver = driver
+        self.url = driver.current_url
+        self.batch_extract = batch_extract
+
+    @staticmethod
+    def _first_text(element, css):
+        if not css:
+            return None
+        try:
+            return element.find_element(By.CSS_SELECTOR, css).text.strip()
+        except NoSuchElementException:
+            return None
+
+    def cards(self, selectors):
+        if self.batch_extract:
+            return self._cards_batched(selectors)
+        return self._cards_per_element(selectors)
+
+    def _cards_batched(self, selectors):
+        result = json.loads(self.driver.execute_script(EXTRACT_CARDS_JS, selectors))
+        if result['skipped']:
+            logging.warning("Skipped %s articles due to missing title elements.", result['skipped'])
+        return result['cards']
+
+    def _cards_per_element(self, selectors):
+        cards = []
+        for card in self.driver.find_elements(By.CSS_SELECTOR, selectors['card']):
+            try:
+                title_element = card.find_element(By.CSS_SELECTOR, selectors['title'])
+                cards.append({
+                    'title': title_element.text.strip(),
+                    'link': (title_element.get_attribute('href') or '').strip(),
+                    'excerpt': self._first_text(card, selectors.get('excerpt')),
+                    'date': self._first_text(card, selectors.get('date')),
+                })
+            except NoSuchElementException as e:
+                logging.warning("Skipping article due to missing elements: %s", e)
+                continue
+        return cards
+
+    def links(self, css):
+        return [
+            (el.text.strip(), el.get_attribute('href'))
+            for el in self.driver.find_elements(By.CSS_SELECTOR, css)
+        ]
+
+    def texts(self, css):
+        return [el.text.strip() for el in self.driver.find_elements(By.CSS_SELECTOR, css)]
+
+
+class SeleniumFetcher:
+    """Renders pages in Chrome, using a driver leased from a DriverPool.
+
+    The lease is held across fetches so the page returned by fetch() stays
+    usable, and is handed back once the driver has served the pool's
+    recycle_after pages or when the fetcher is closed. Without a shared pool
+    the fetcher owns a private single-driver pool.
+    """
+    engine = 'selenium'
+
+    def __init__(self, chromedriver_path, timeout=40, headless=True, batch_extract=True, pool=None):
+        self.timeout = timeout
+        self.batch_extract = batch_extract
+        self.owns_pool = pool is None
+        self.pool = pool or DriverPool(chromedriver_path, size=1, headless=headless)
+        self.lease = None
+
+    def _load(self, url, wait_for):
+        if self.lease is not None and self.lease.pages >= self.pool.recycle_after:
+            self.pool.release(self.lease)
+            self.lease = None
+        if self.lease is None:
+            with timer('driver_acquire'):
+                self.lease = self.pool.acquire()
+
+        driver = self.lease.driver
+        with timer('driver_get'):
+            driver.get(url)
+        self.lease.pages += 1
+        if wait_for:
+            try:
+                with timer('driver_wait'):
+                    WebDriverWait(driver, self.timeout).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, wait_for))
+                    )
+            except TimeoutException:
+                logging.error("Timeout waiting for articles to load.")
+                count('timeouts')
+        return SeleniumPage(driver, self.batch_extract)
+
+    def fetch(self, url, wait_for=None):
+        try:
+            return self._load(url, wait_for)
+        except WebDriverException as e:
+            # Replace the driver and retry once rather than abandoning the crawl.
+            logging.warning("WebDriver failed on %s, recycling it and retrying: %s", url, e)
+            count('retries')
+            if self.lease is not None:
+                self.pool.release(self.lease, broken=True)
+                self.lease = None
+            return self._load(url, wait_for)
+
+    def release(self):
+        # Hand the driver back to the pool; the last page must not be used after this.
+        if self.lease is not None:
+            self.pool.release(self.lease)
+            self.lease = None
+
+    def close(self):
+        self.release()
+        if self.owns_pool:
+            self.pool.close()
+            logging.info("Web driver closed.")
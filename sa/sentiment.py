@@ -0,0 +1,247 @@
+import argparse
+import bisect
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import settings
+from .article_body import content_hash
+from .metrics import count
+
+# Sentiment of matched articles, scored with TextBlob after matching. Each
+# record gets the polarity (-1..1) and subjectivity (0..1) of its article
+# and, with contexts enabled, the polarity of the sentences around the
+# mentions of its entity. Texts are scored in batches on a process pool;
+# scores are cached by content hash in SQLite, so re-runs, duplicate
+# articles and entities sharing a context cost nothing. TextBlob is only
+# imported by the worker processes.
+SENTIMENT_WORKERS = os.cpu_count() or 1
+BATCH_SIZE = 64  # Texts per task sent to a worker process
+CONTEXT_SENTENCES = 1  # Sentences either side of an entity mention
+SCORER = 'textblob'  # Part of the cache key; change when scoring changes
+SENTIMENT_FILE = 'sentiment.csv'
+DEFAULT_CACHE = os.path.join(settings.DATA_DIR, 'sentiment.sqlite3')
+SENTIMENT_HEADER = ['Source', 'Entity', 'Title', 'Link', 'Sentiment', 'Subjectivity', 'Entity Sentiment']
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def score_texts(texts):
+    """(polarity, subjectivity) of each text. Runs in the worker processes."""
+    from textblob import TextBlob
+    scores = []
+    for text in texts:
+        sentiment = TextBlob(text).sentiment
+        scores.append((sentiment.polarity, sentiment.subjectivity))
+    return scores
+
+
+def sentence_starts(text):
+    return [0] + [m.end() for m in _SENTENCE_END_RE.finditer(text)]
+
+
+def entity_contexts(text, index, window=CONTEXT_SENTENCES):
+    """{entity: the sentences around its mentions in text}."""
+    starts = sentence_starts(text)
+    bounds = starts[1:] + [len(text)]
+    selected = {}
+    for start, _, entity, _ in index.find_all(text):
+        sentence = bisect.bisect_right(starts, start) - 1
+        chosen = selected.setdefault(entity, set())
+        chosen.update(range(max(0, sentence - window), min(len(starts), sentence + window + 1)))
+    return {
+        entity: ' '.join(text[starts[i]:bounds[i]].strip() for i in sorted(sentences))
+        for entity, sentences in selected.items()
+    }
+
+
+class SentimentCache:
+    """Scores keyed by content hash, backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS scores ('
+                ' hash TEXT PRIMARY KEY,'
+                ' polarity REAL,'
+                ' subjectivity REAL)'
+            )
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        with self.lock:
+            # Stay under SQLite's limit on bound parameters
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, polarity, subjectivity FROM scores WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update((h, (polarity, subjectivity)) for h, polarity, subjectivity in rows)
+        return found
+
+    def put_many(self, scores):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO scores VALUES (?, ?, ?)',
+                [(h, polarity, subjectivity) for h, (polarity, subjectivity) in scores.items()],
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+        logging.info("Closed sentiment cache %s.", self.path)
+
+
+class SentimentScorer:
+    """Scores texts through the cache and a shared process pool.
+
+    One instance is shared by every crawl section; the pool is started on
+    the first cache miss. With `contexts` every record is also scored on the
+    sentences around its entity, found with `index`.
+    """
+
+    def __init__(self, cache=None, workers=SENTIMENT_WORKERS, batch_size=BATCH_SIZE, contexts=False, index=None,
+                 score_function=score_texts):
+        self.cache = cache
+        self.workers = workers
+        self.batch_size = batch_size
+        self.contexts = contexts
+        self.index = index
+        self.score_function = score_function
+        self.pool = None
+        self.lock = threading.Lock()
+        self.stats = {'texts': 0, 'scored': 0, 'cache_hits': 0, 'seconds': 0.0}
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def score(self, texts):
+        """(polarity, subjectivity) for each text, in order."""
+        started = time.monotonic()
+        hashes = [content_hash(SCORER, text) for text in texts]
+        scores = self.cache.get_many(set(hashes)) if self.cache is not None else {}
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in scores:
+                missing.setdefault(h, text)
+        self._count('texts', len(texts))
+        self._count('cache_hits', len(texts) - sum(1 for h in hashes if h in missing))
+        if missing:
+            keys = list(missing)
+            chunks = [[missing[h] for h in keys[i:i + self.batch_size]] for i in range(0, len(keys), self.batch_size)]
+            fresh = {}
+            for start, results in zip(range(0, len(keys), self.batch_size), self._pool().map(self.score_function, chunks)):
+                fresh.update(zip(keys[start:start + self.batch_size], results))
+            if self.cache is not None:
+                self.cache.put_many(fresh)
+            scores.update(fresh)
+            self._count('scored', len(fresh))
+            count('sentiment_scored', len(fresh))
+        self._count('seconds', time.monotonic() - started)
+        return [scores[h] for h in hashes]
+
+    def score_records(self, records, articles=None):
+        """Set sentiment, subjectivity and entity_sentiment on matched records.
+
+        `articles` maps links to the article dicts, whose bodies are scored
+        when they were fetched.
+        """
+        articles = articles or {}
+        texts, contexts = {}, {}
+        for record in records:
+            link = record['link']
+            if link not in texts:
+                article = articles.get(link, {})
+                texts[link] = f"{record['title']}. {article.get('body') or record.get('excerpt') or ''}"
+                if self.contexts and self.index is not None:
+                    contexts[link] = entity_contexts(texts[link], self.index)
+        pending = list(texts.values())
+        context_keys = [(link, entity) for link, found in contexts.items() for entity in found]
+        pending += [contexts[link][entity] for link, entity in context_keys]
+        if not pending:
+            return records
+        scores = self.score(pending)
+        by_link = dict(zip(texts, scores))
+        by_context = dict(zip(context_keys, scores[len(texts):]))
+        for record in records:
+            record['sentiment'], record['subjectivity'] = by_link[record['link']]
+            context = by_context.get((record['link'], record['entity']))
+            record['entity_sentiment'] = context[0] if context else None
+        return records
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.stats)
+        metrics['texts_per_second'] = metrics['texts'] / metrics['seconds'] if metrics['seconds'] else 0.0
+        return metrics
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        if self.stats['texts']:
+            logging.info("Sentiment metrics: %s", self.metrics())
+
+
+def sentiment_rows(records):
+    for record in records:
+        yield [
+            record['source'],
+            record['entity'],
+            record['title'],
+            record['link'],
+            record.get('sentiment'),
+            record.get('subjectivity'),
+            record.get('entity_sentiment'),
+        ]
+
+
+def main(argv=None):
+    """Score archived matches, e.g. after a backfill."""
+    parser = argparse.ArgumentParser(prog='python -m sa.sentiment', description="Score archived matches.")
+    parser.add_argument('--days', type=int, default=365, help="Score matches from this many days back.")
+    parser.add_argument('--sources', nargs='+')
+    parser.add_argument('--contexts', action='store_true', help="Also score the sentences around each entity.")
+    parser.add_argument('--workers', type=int, default=SENTIMENT_WORKERS)
+    parser.add_argument('--output', default=os.path.join(settings.DATA_DIR, 'sentiment-backfill.csv'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # Imported here: pyarrow is only needed for backfills
+    from .keyword_index import load_index
+    from .pipeline import CsvSink
+    from .store import ArticleStore
+
+    since = datetime.date.today() - datetime.timedelta(days=args.days)
+    records = ArticleStore().query(since=since, sources=args.sources).to_pylist()
+    index = load_index(settings.KEYWORDS_FILE) if args.contexts else None
+    scorer = SentimentScorer(SentimentCache(DEFAULT_CACHE), args.workers, contexts=args.contexts, index=index)
+    sink = CsvSink(args.output, SENTIMENT_HEADER, append=False)
+    try:
+        scorer.score_records(records)
+        sink.write(sentiment_rows(records))
+    finally:
+        sink.close()
+        scorer.close()
+        scorer.cache.close()
+    print(f"Scored {len(records)} matches into {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import os
+
+# Paths default to folders next to the package and can be moved with
+# environment variables, so nothing machine-specific is hard-coded.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.environ.get('SA_DATA_DIR', os.path.join(BASE_DIR, 'scrapedata'))
+LOG_DIR = os.environ.get('SA_LOG_DIR', os.path.join(BASE_DIR, 'log'))
+KEYWORDS_FILE = os.environ.get('SA_KEYWORDS_FILE', os.path.join(BASE_DIR, 'keywords.json'))
+SITES_FILE = os.environ.get('SA_SITES_FILE', os.path.join(BASE_DIR, 'sites.json'))
+HTTP_CACHE_DIR = os.environ.get('SA_HTTP_CACHE_DIR', os.path.join(DATA_DIR, 'http-cache'))
+LOG_LEVEL = os.environ.get('SA_LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('SA_LOG_FORMAT', 'json')  # 'json' or 'text'
+# None lets Selenium Manager locate a matching chromedriver
+CHROMEDRIVER_PATH = os.environ.get('CHROMEDRIVER_PATH')
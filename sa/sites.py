@@ -0,0 +1,170 @@
+import datetime
+import json
+import logging
+import os
+
+from . import settings
+from .dates import published_date
+from .pagination import PagePlan
+
+# Every outlet is described by a profile in sites.json:
+#   urls, engine, selenium_fallback, discovery, selectors - read by the fetchers
+#   pagination  - {'strategy': 'next_link' | 'numbered', ...}; numbered
+#                 listings with 'parallel': N fetch N pages at a time
+#   max_pages, timeout, missing_excerpt
+#   output      - CSV file name, layout and columns
+# Layouts: 'per_entity' writes one row per matched entity and article;
+# 'per_article' one row per article listing all its entities.
+COLUMN_HEADERS = {
+    'entity': 'Entity',
+    'keyword': 'Keyword',
+    'entities': 'Entities',
+    'keywords': 'Keywords',
+    'title': 'Title',
+    'link': 'Link',
+    'excerpt': 'Excerpt',
+    'publication_date': 'Publication Date',
+}
+
+
+def day_directory(day=None):
+    # One directory per run date: <data>/<YYYY>/<MM>/<DD>
+    day = day or datetime.datetime.now()
+    directory = os.path.join(settings.DATA_DIR, day.strftime('%Y'), day.strftime('%m'), day.strftime('%d'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def load_profiles(path=None):
+    with open(path or settings.SITES_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SiteAdapter:
+    """Scraping behaviour of one outlet, driven entirely by its profile."""
+
+    def __init__(self, name, profile):
+        self.name = name
+        self.site = dict(profile, name=name)
+        self.urls = profile['urls']
+        self.max_pages = profile.get('max_pages', 1)
+        self.timeout = profile.get('timeout', 30)
+        self.chromedriver_path = settings.CHROMEDRIVER_PATH
+        self.pagination = profile.get('pagination', {'strategy': 'next_link', 'next': 'a[rel="next"]'})
+        self.parallel_pages = self.pagination.get('parallel', 0) if self.pagination['strategy'] == 'numbered' else 0
+        self.missing_excerpt = profile.get('missing_excerpt')
+        output = profile['output']
+        self.output_name = output['file']
+        self.layout = output.get('layout', 'per_entity')
+        self.columns = output['columns']
+        self.csv_header = [COLUMN_HEADERS[column] for column in self.columns]
+
+    def output_path(self, day=None):
+        return os.path.join(day_directory(day), self.output_name)
+
+    def scrape_articles(self, articles, index):
+        results = []
+        seen = set()
+
+        for article in articles:
+            try:
+                title = article['title']
+                link = article['link']
+                excerpt = article['excerpt'] or self.missing_excerpt
+                published = published_date(article)
+                publication_date = published.isoformat() if published else "Unknown"
+
+                # Combine title, excerpt and (when fetched) the article body for keyword matching
+                content = f"{title} {article['excerpt'] or ''} {article.get('body') or ''}"
+                matched_entities = index.match(content)
+                if not matched_entities:
+                    continue
+
+                row = {
+                    'title': title,
+                    'link': link,
+                    'excerpt': excerpt,
+                    'publication_date': publication_date,
+                }
+                if self.layout == 'per_article':
+                    results.append(dict(row, entities=list(matched_entities), keywords=list(matched_entities.values())))
+                    logging.info("[%s] Matched Article - Title: %s, Link: %s", self.name, title, link,
+                                 extra={'article': link, 'stage': 'match'})
+                    continue
+                for entity, keyword in matched_entities.items():
+                    # The same article can be listed twice on a page
+                    if (entity, link) in seen:
+                        continue
+                    seen.add((entity, link))
+                    results.append(dict(row, entity=entity, keyword=keyword))
+                    logging.info("[%s] Matched Article - Entity: %s, Keyword: %s, Title: %s, Link: %s",
+                                 self.name, entity, keyword, title, link, extra={'article': link, 'stage': 'match'})
+            except Exception as e:
+                logging.error("[%s] Unexpected error processing article: %s", self.name, e,
+                              extra={'article': article.get('link'), 'stage': 'match'})
+                continue
+
+        return results
+
+    def next_page_url(self, page):
+        strategy = self.pagination['strategy']
+        if strategy == 'next_link':
+            links = page.links(self.pagination['next'])
+            return links[0][1] if links else None
+        if strategy == 'numbered':
+            return self._numbered_next_page(page)
+        raise ValueError(f"Unknown pagination strategy '{strategy}' for site {self.name}")
+
+    def plan_pages(self, page):
+        """Direct page URLs of a numbered listing (a PagePlan), or None."""
+        if self.pagination['strategy'] != 'numbered':
+            return None
+        return PagePlan.from_page(page, self.pagination['container'])
+
+    def _numbered_next_page(self, page):
+        container = self.pagination['container']
+
+        # Prefer the 'Next' link
+        for text, href in page.links(f'{container} a'):
+            if text == self.pagination.get('next_text', 'Next'):
+                return href
+
+        # Fall back to the numeric link for current page + 1
+        current = page.texts(f'{container} span.current')
+        try:
+            current_page_number = int(current[0])
+        except (IndexError, ValueError):
+            logging.info("[%s] Pagination elements not found.", self.name)
+            return None
+
+        for text, href in page.links(f'{container} a.page-numbers'):
+            try:
+                if int(text) == current_page_number + 1:
+                    return href
+            except ValueError:
+                continue
+        return None
+
+    def csv_rows(self, results):
+        for row in results:
+            yield [
+                '; '.join(row[column]) if column in ('entities', 'keywords') else row[column]
+                for column in self.columns
+            ]
+
+    def iter_records(self, results):
+        for row in results:
+            pairs = zip(row['entities'], row['keywords']) if self.layout == 'per_article' else [(row['entity'], row['keyword'])]
+            for entity, keyword in pairs:
+                yield {
+                    'entity': entity,
+                    'keyword': keyword,
+                    'title': row['title'],
+                    'link': row['link'],
+                    'excerpt': row['excerpt'],
+                    'published_at': None if row['publication_date'] == "Unknown" else row['publication_date'],
+                }
+
+
+def load_sites(path=None):
+    return {name: SiteAdapter(name, profile) for name, profile in load_profiles(path).items()}
@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import glob
+import logging
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from . import settings
+
+# Matched articles are archived as Parquet files partitioned by source and
+# scrape date:
+#   <root>/source=<source>/date=<YYYY-MM-DD>/part-<time>-<id>.parquet
+# Every append writes a new part file, so runs never overwrite each other;
+# compact() folds the parts of a partition into one file. Columns added to
+# the schema later (the sentiment scores) read as null from older parts.
+SCHEMA = pa.schema([
+    ('source', pa.string()),
+    ('section', pa.string()),
+    ('entity', pa.string()),
+    ('keyword', pa.string()),
+    ('title', pa.string()),
+    ('link', pa.string()),
+    ('excerpt', pa.string()),
+    ('published_at', pa.date32()),
+    ('scraped_at', pa.timestamp('s')),
+    ('sentiment', pa.float32()),
+    ('subjectivity', pa.float32()),
+    ('entity_sentiment', pa.float32()),
+])
+
+DEFAULT_ROOT = os.path.join(settings.DATA_DIR, 'archive')
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class ArticleStore:
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def partition_dir(self, source, day):
+        return os.path.join(self.root, f'source={source}', f'date={day.isoformat()}')
+
+    def append(self, records, scraped_at=None):
+        """Append records (dicts keyed by SCHEMA names) and return the files written."""
+        scraped_at = (scraped_at or datetime.datetime.now()).replace(microsecond=0)
+        by_source = {}
+        for record in records:
+            row = {name: record.get(name) for name in SCHEMA.names}
+            row['published_at'] = _to_date(row['published_at'])
+            row['scraped_at'] = row['scraped_at'] or scraped_at
+            by_source.setdefault(row['source'], []).append(row)
+
+        written = []
+        for source, rows in by_source.items():
+            directory = self.partition_dir(source, scraped_at.date())
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{scraped_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            path = os.path.join(directory, name)
+            self._write(pa.Table.from_pylist(rows, schema=SCHEMA), path)
+            written.append(path)
+            logging.info("Archived %s records to %s", len(rows), path)
+        return written
+
+    @staticmethod
+    def _write(table, path):
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    def partitions(self, sources=None, since=None, until=None):
+        """Partition directories for the given sources and scrape-date range."""
+        since, until = _to_date(since), _to_date(until)
+        selected = []
+        for source_dir in sorted(glob.glob(os.path.join(self.root, 'source=*'))):
+            source = os.path.basename(source_dir).split('=', 1)[1]
+            if sources and source not in sources:
+                continue
+            for date_dir in sorted(glob.glob(os.path.join(source_dir, 'date=*'))):
+                day = _to_date(os.path.basename(date_dir).split('=', 1)[1])
+                if day is None or (since and day < since) or (until and day > until):
+                    continue
+                selected.append(date_dir)
+        return selected
+
+    def compact(self, sources=None, since=None, until=None):
+        """Merge the part files of each partition into a single file."""
+        compacted = 0
+        for directory in self.partitions(sources, since, until):
+            parts = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+            if len(parts) < 2:
+                continue
+            table = pa.concat_tables([pq.read_table(part, schema=SCHEMA) for part in parts])
+            path = os.path.join(directory, f"part-compacted-{uuid.uuid4().hex[:8]}.parquet")
+            self._write(table.sort_by([('scraped_at', 'ascending')]), path)
+            for part in parts:
+                os.remove(part)
+            compacted += 1
+            logging.info("Compacted %s files into %s", len(parts), path)
+        return compacted
+
+    def query(self, entity=None, since=None, until=None, sources=None, columns=None):
+        """Return a pyarrow Table of archived matches.
+
+        Only partitions whose scrape date falls in [since, until] are opened
+        (an article is never scraped before it is published), and only the
+        requested columns are read. Rows are then filtered on entity and on
+        published_at, falling back to scraped_at when the date is unknown.
+        """
+        since, until = _to_date(since), _to_date(until)
+        files = [
+            path
+            for directory in self.partitions(sources, since, None)
+            for path in sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+        ]
+        columns = list(columns) if columns else SCHEMA.names
+        if not files:
+            return SCHEMA.empty_table().select(columns)
+
+        dataset = ds.dataset(files, schema=SCHEMA, format='parquet')
+        article_day = ds.field('published_at')
+        scraped_day = ds.field('scraped_at').cast(pa.date32())
+        condition = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if entity is not None:
+            condition = both(condition, ds.field('entity') == entity)
+        if since is not None:
+            condition = both(condition, (article_day >= pa.scalar(since, pa.date32())) | (
+                article_day.is_null() & (scraped_day >= pa.scalar(since, pa.date32()))))
+        if until is not None:
+            condition = both(condition, (article_day <= pa.scalar(until, pa.date32())) | (
+                article_day.is_null() & (scraped_day <= pa.scalar(until, pa.date32()))))
+        return dataset.to_table(columns=columns, filter=condition)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact the Parquet article archive.")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help="Archive directory.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    compact = sub.add_parser('compact', help="Merge part files per partition.")
+    compact.add_argument('--sources', nargs='+')
+
+    query = sub.add_parser('query', help="Print archived matches.")
+    query.add_argument('--entity')
+    query.add_argument('--days', type=int, default=90, help="Look back this many days.")
+    query.add_argument('--sources', nargs='+')
+    query.add_argument('--columns', nargs='+', default=['published_at', 'source', 'entity', 'title', 'link'])
+    args = parser.parse_args(argv)
+
+    store = ArticleStore(args.root)
+    if args.command == 'compact':
+        print(f"Compacted {store.compact(args.sources)} partitions.")
+    else:
+        since = datetime.date.today() - datetime.timedelta(days=args.days)
+        table = store.query(args.entity, since=since, sources=args.sources, columns=args.columns)
+        for row in table.to_pylist():
+            print(' | '.join(str(row[c]) for c in args.columns))
+        print(f"{table.num_rows} rows.")
+
+
+if __name__ == "__main__":
+    main()
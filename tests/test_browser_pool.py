@@ -0,0 +1,39 @@
+from sa import browser_pool
+from sa.browser_pool import DriverPool
+from sa.metrics import REGISTRY
+
+# Pool metrics reach the registry as they happen. Drivers are replaced by a
+# stand-in so the pool can be exercised without Chrome.
+
+
+class FakeDriver:
+    def quit(self):
+        pass
+
+
+def test_pool_metrics_reach_registry(monkeypatch):
+    monkeypatch.setattr(browser_pool, 'init_driver', lambda *args: FakeDriver())
+    REGISTRY.reset()
+    pool = DriverPool(None, size=2, recycle_after=2)
+    try:
+        for _ in range(3):
+            lease = pool.acquire()
+            lease.pages += 1
+            pool.release(lease)
+        lease = pool.acquire()
+        snapshot = REGISTRY.snapshot()
+        assert snapshot['gauges'] == {
+            'browser_pool_idle': 0,
+            'browser_pool_in_use': 1,
+            'browser_pool_recycle_after': 2,
+            'browser_pool_size': 2,
+        }
+        stages = {r['stage']: r['calls'] for r in snapshot['stages']}
+        assert stages == {'driver_lease_wait': 4, 'driver_lease': 3}
+        counters = {r['name']: r['value'] for r in snapshot['counters']}
+        assert counters == {'drivers_created': 2, 'drivers_recycled': 1}
+        assert 'sa_browser_pool_in_use 1' in REGISTRY.prometheus()
+        pool.release(lease)
+    finally:
+        pool.close()
+        REGISTRY.reset()
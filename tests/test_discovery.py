@@ -0,0 +1,109 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from bench.replay import FIXTURES_DIR, ReplayServer
+from sa.discovery import FeedDiscovery, parse_rss, parse_wp_posts
+
+# Parsers against the saved wp-json/RSS fixtures, and FeedDiscovery against
+# the replay server, which serves them where discovery asks for them.
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, 'wordpress', name), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='module')
+def server():
+    with ReplayServer(depth=2) as server:
+        yield server
+
+
+def test_parse_wp_posts():
+    articles = parse_wp_posts(read_fixture('posts.json'))
+    assert len(articles) == 12
+    assert articles[0] == {
+        'title': 'AUB looks to increase e-wallet market share',
+        'link': 'https://www.bworldonline.com/banking-finance/2024/11/27/637400/aub-looks-to-increase-e-wallet-market/',
+        'excerpt': 'ASIA UNITED Bank Corp. (AUB) is planning to grow its share of the e-wallet market as more '
+                   'Filipinos shift to digital payments... […]',
+        'date': '2024-11-26T16:00:00+00:00',
+    }
+
+
+def test_parse_wp_posts_local_dates_and_missing_fields():
+    posts = json.loads(read_fixture('posts.json'))[:3]
+    del posts[0]['date_gmt']
+    posts[1]['title']['rendered'] = '  '
+    del posts[2]['excerpt']
+    articles = parse_wp_posts(posts)
+    assert [a['date'] for a in articles] == ['2024-11-27T00:00:00', '2024-11-26T18:00:00+00:00']
+    assert articles[1]['excerpt'] is None
+
+
+def test_parse_rss():
+    articles = parse_rss(read_fixture('feed.xml'))
+    assert len(articles) == 12
+    assert articles[0] == {
+        'title': 'AUB looks to increase e-wallet market share',
+        'link': 'https://businessmirror.com.ph/2024/11/27/post-0/',
+        'excerpt': 'ASIA UNITED Bank Corp. (AUB) is planning to grow its share of the e-wallet market as more '
+                   'Filipinos shift to digital payments...',
+        'date': '2024-11-27T00:00:00+00:00',
+    }
+
+
+def test_parse_rss_rejects_other_documents():
+    with pytest.raises(ValueError):
+        parse_rss(b'<html><body>Not a feed</body></html>')
+
+
+def test_wp_json_discovery(server):
+    discovery = FeedDiscovery()
+    try:
+        method, url = discovery.plan(server.site_url('bworld', 'banking-finance/'), ['wp-json', 'feed'])
+        assert method == 'wp-json'
+        assert url.startswith(f'{server.base_url}/wp-json/wp/v2/posts?categories=1&')
+        articles, next_url = discovery.fetch(url)
+    finally:
+        discovery.close()
+    assert len(articles) == 12
+    assert articles[0]['link'].startswith(server.site_url('bworld', 'banking-finance/2024/11/27/'))
+    assert next_url is None
+
+
+def test_wp_json_discovery_since(server):
+    discovery = FeedDiscovery(since=datetime.date(2024, 11, 27))
+    try:
+        _, url = discovery.plan(server.site_url('bworld', 'banking-finance/'), ['wp-json'])
+        assert 'after=2024-11-27T00%3A00%3A00' in url
+        # The fixture's posts were published on 2024-11-26 GMT
+        assert discovery.fetch(url) == ([], None)
+    finally:
+        discovery.close()
+
+
+def test_feed_discovery_pages(server):
+    discovery = FeedDiscovery()
+    try:
+        method, url = discovery.plan(server.site_url('businessmirror', 'business/'), ['feed'])
+        assert (method, url) == ('feed', server.site_url('businessmirror', 'business/feed/'))
+        pages = []
+        while url:
+            articles, url = discovery.fetch(url)
+            pages.append(len(articles))
+    finally:
+        discovery.close()
+    # Past the last page the feed answers 404, which ends the listing
+    assert pages == [12, 12, 0]
+
+
+def test_no_discovery_for_unknown_section(server):
+    discovery = FeedDiscovery()
+    try:
+        assert discovery.plan(server.site_url('nosuch', 'section/'), ['feed']) is None
+    finally:
+        discovery.close()
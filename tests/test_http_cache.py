@@ -0,0 +1,33 @@
+import time
+
+import requests
+
+from bench.replay import ReplayServer
+from sa.http_cache import HttpCache, main
+
+
+def test_revalidates_with_etag(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    with ReplayServer(depth=1) as server, requests.Session() as session:
+        url = server.site_url('bworld', 'section/')
+        first = cache.get(session, url)
+        second = cache.get(session, url)
+    cache.close()
+    assert second.content == first.content
+    assert cache.stats['misses'] == 1
+    assert cache.stats['not_modified'] == 1
+
+
+def test_stats_command_does_not_evict(tmp_path, capsys):
+    cache = HttpCache(str(tmp_path))
+    with ReplayServer(depth=1) as server, requests.Session() as session:
+        cache.get(session, server.site_url('bworld', 'section/'))
+    # Past the TTL the entry would be evicted
+    with cache.lock, cache.conn:
+        cache.conn.execute('UPDATE responses SET validated_at = ?', (time.time() - 10,))
+    cache.close(evict=False)
+
+    main(['stats', '--dir', str(tmp_path), '--ttl', '1'])
+    assert capsys.readouterr().out.startswith('1 responses')
+    main(['evict', '--dir', str(tmp_path), '--ttl', '1'])
+    assert capsys.readouterr().out.startswith('0 responses')
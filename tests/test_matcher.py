@@ -0,0 +1,23 @@
+from sa.matcher import KeywordMatcher
+
+
+def test_overlapping_keywords():
+    matcher = KeywordMatcher(['bank', 'ank'])
+    assert matcher.find_all('xbank ank', word_boundaries=False) == [(1, 5, 'bank'), (2, 5, 'ank'), (6, 9, 'ank')]
+
+
+def test_word_boundaries():
+    matcher = KeywordMatcher(['bdo', 'alipay+'])
+    assert matcher.matched_keywords('BDO and Alipay+ but not bdoX') == ['bdo', 'alipay+']
+
+
+def test_add_after_compile():
+    matcher = KeywordMatcher(['bank', 'ank'])
+    assert matcher.find_all('xbank', word_boundaries=False) == [(1, 5, 'bank'), (2, 5, 'ank')]
+    # Recompiling must not merge the failure outputs a second time
+    matcher.add('nk')
+    assert matcher.find_all('xbank', word_boundaries=False) == [(1, 5, 'bank'), (2, 5, 'ank'), (3, 5, 'nk')]
+    matcher.add('k')
+    assert matcher.find_all('xbank', word_boundaries=False) == [
+        (1, 5, 'bank'), (2, 5, 'ank'), (3, 5, 'nk'), (4, 5, 'k'),
+    ]
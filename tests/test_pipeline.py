@@ -0,0 +1,36 @@
+from bench.replay import ReplayServer
+from sa.fetcher import HttpFetcher
+from sa.pipeline import fetch_pages_parallel
+from sa.ratelimit import HostRateLimiter
+from sa.sites import load_sites
+
+# Parallel listing fetches against the replay server: pages come back in
+# order, and a consumer that stops early leaves few pages fetched for nothing.
+DEPTH = 20
+WORKERS = 4
+
+
+def listing(server, max_pages=DEPTH):
+    adapter = load_sites()['businessmirror']
+    start_url = server.site_url('businessmirror', 'business/')
+    return fetch_pages_parallel(HttpFetcher, HostRateLimiter(1000.0, 100), start_url, 0, max_pages, adapter.site,
+                                adapter.plan_pages, WORKERS)
+
+
+def test_pages_in_order():
+    with ReplayServer(depth=DEPTH) as server:
+        batches = list(listing(server))
+    assert [batch.page_number for batch in batches] == list(range(DEPTH))
+    assert batches[1].url == server.site_url('businessmirror', 'business/page/2/')
+    assert batches[-1].next_url is None
+    assert all(len(batch.articles) == 10 for batch in batches)
+
+
+def test_early_stop_bounds_prefetch():
+    with ReplayServer(depth=DEPTH) as server:
+        batches = listing(server)
+        assert [next(batches).page_number for _ in range(2)] == [0, 1]
+        batches.close()
+        # The first page, then one round of workers before the consumer
+        # came back for more
+        assert server.requests <= 1 + WORKERS
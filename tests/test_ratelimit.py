@@ -0,0 +1,74 @@
+import csv
+import json
+import threading
+import time
+
+from bench.replay import ReplayServer
+from sa import settings
+from sa.crawl import run_crawl
+from sa.ratelimit import HostRateLimiter, TokenBucket
+from sa.resilience import host_of
+from sa.sites import load_sites
+
+# TokenBucket timing, and a crawl against the replay server whose requests
+# must stay within the limiter's rate and burst.
+RATE = 20.0
+BURST = 2
+SLACK = 0.01  # Seconds of scheduling noise allowed between two grants
+
+
+class RecordingLimiter(HostRateLimiter):
+    """Notes when each request was let through, per host."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.granted = {}
+        self.granted_lock = threading.Lock()
+
+    def acquire(self, url):
+        super().acquire(url)
+        with self.granted_lock:
+            self.granted.setdefault(host_of(url), []).append(time.monotonic())
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(50.0, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.02
+    for _ in range(5):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert 0.09 <= elapsed < 0.3
+    assert 0.0 < bucket.try_acquire() <= 1 / 50.0
+
+
+def test_crawl_rows_and_pacing(tmp_path, monkeypatch):
+    keywords = tmp_path / 'keywords.json'
+    keywords.write_text(json.dumps(['asia united bank corp.; aub']), encoding='utf-8')
+    monkeypatch.setattr(settings, 'KEYWORDS_FILE', str(keywords))
+    monkeypatch.setattr(settings, 'DATA_DIR', str(tmp_path))
+    limiter = RecordingLimiter(RATE, BURST)
+    with ReplayServer(depth=3) as server:
+        urls = {
+            'bworld': [server.site_url('bworld', 'banking-finance/')],
+            'businessmirror': [server.site_url('businessmirror', 'business/')],
+        }
+        paths = run_crawl(list(urls), limiter=limiter, urls=urls, max_pages=3, sites=load_sites())
+        requests = server.requests
+
+    for site, path in paths.items():
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        # The fixture listings carry one AUB story per page
+        assert [row['Entity'] for row in rows] == ['asia united bank corp.'] * 3
+        assert len({row['Link'] for row in rows}) == 3
+        assert all(row['Link'].startswith(server.site_url(site)) for row in rows)
+
+    assert list(limiter.granted) == [host_of(server.base_url)]
+    granted = limiter.granted[host_of(server.base_url)]
+    assert len(granted) == requests == 6
+    for i in range(len(granted)):
+        for j in range(i + 1, len(granted)):
+            assert j - i + 1 <= BURST + RATE * (granted[j] - granted[i] + SLACK)
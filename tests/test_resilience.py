@@ -0,0 +1,94 @@
+import time
+
+import pytest
+import requests
+
+from bench.replay import ReplayServer
+from sa import resilience as resilience_module
+from sa.metrics import REGISTRY
+from sa.resilience import HostUnavailable, Resilience
+
+# The retry, circuit-breaker and adaptive-timeout policy against the replay
+# server's injected faults. All sites share the server's host, so each test
+# starts its own server.
+
+
+@pytest.fixture
+def session():
+    session = requests.Session()
+    yield session
+    session.close()
+
+
+def get(policy, session, url):
+    return policy.request(url, lambda timeout: session.get(url, timeout=timeout), timeout=10)
+
+
+def counter(name):
+    return sum(r['value'] for r in REGISTRY.snapshot()['counters'] if r['name'] == name)
+
+
+def test_retries_hide_transient_errors(session):
+    REGISTRY.reset()
+    policy = Resilience(retries=5, backoff=0, failure_threshold=100, seed=1)
+    with ReplayServer(error_rate=0.3, seed=1) as server:
+        url = server.site_url('bworld', 'section/')
+        statuses = [get(policy, session, url).status_code for _ in range(20)]
+    assert statuses == [200] * 20
+    assert server.errors > 0
+    assert server.requests == 20 + server.errors
+    assert counter('retries') == server.errors
+
+
+def test_circuit_opens_and_rejects_fast(session):
+    REGISTRY.reset()
+    policy = Resilience(retries=0, failure_threshold=3, cooldown=60)
+    with ReplayServer(down={'bworld'}) as server:
+        url = server.site_url('bworld', 'section/')
+        assert [get(policy, session, url).status_code for _ in range(3)] == [503] * 3
+        assert policy.health(url).state == 'open'
+        started = time.monotonic()
+        with pytest.raises(HostUnavailable):
+            get(policy, session, url)
+        assert time.monotonic() - started < 0.1
+        assert server.requests == 3
+    assert counter('circuit_opened') == 1
+    assert counter('circuit_rejected') == 1
+
+
+def test_half_open_probe(session):
+    policy = Resilience(retries=0, failure_threshold=2, cooldown=0.1)
+    with ReplayServer(down={'bworld'}) as server:
+        url = server.site_url('bworld', 'section/')
+        for _ in range(2):
+            get(policy, session, url)
+        health = policy.health(url)
+        assert health.state == 'open'
+        # A failed probe keeps the circuit open for twice as long
+        time.sleep(0.15)
+        assert get(policy, session, url).status_code == 503
+        assert (health.state, health.cooldown) == ('open', 0.2)
+        with pytest.raises(HostUnavailable):
+            get(policy, session, url)
+        server.down.clear()
+        time.sleep(0.25)
+        assert get(policy, session, url).status_code == 200
+        assert (health.state, health.cooldown, health.failures) == ('closed', 0.1, 0)
+        assert server.requests == 4
+
+
+def test_timeout_follows_latency(session, monkeypatch):
+    monkeypatch.setattr(resilience_module, 'MIN_TIMEOUT', 0.0)
+    policy = Resilience()
+    with ReplayServer(site_latency={'bworld': 0.05, 'businessmirror': 0.2}) as server:
+        fast, slow = server.site_url('bworld', 'section/'), server.site_url('businessmirror', 'section/')
+        health = policy.health(fast)
+        assert health.timeout(10) == 10
+        for _ in range(resilience_module.MIN_SAMPLES):
+            get(policy, session, fast)
+        assert 0.2 <= health.timeout(10) < 1.0
+        # One host for both sites: the slow site's samples raise the timeout
+        for _ in range(resilience_module.MIN_SAMPLES):
+            get(policy, session, slow)
+        assert health.timeout(10) >= 0.8
+        assert health.timeout(0.5) == 0.5
@@ -0,0 +1,47 @@
+import pytest
+
+from bench.replay import ORIGINS, ReplayServer
+from sa import settings
+from sa.browser_pool import init_driver
+from sa.fetcher import HttpFetcher
+from sa.selenium_fetcher import SeleniumPage
+from sa.sites import load_sites
+
+# The batched execute_script extraction must return the same card dicts as
+# the per-element WebDriver path, on every site's recorded listing, and the
+# same articles as the HTTP path. Needs Chrome; skipped when no driver can be
+# started.
+
+
+@pytest.fixture(scope='module')
+def server():
+    with ReplayServer(depth=2) as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def driver():
+    try:
+        driver = init_driver(settings.CHROMEDRIVER_PATH, headless=True, block_resources=True)
+    except Exception as e:
+        pytest.skip(f"Chrome is not available: {e}")
+    yield driver
+    driver.quit()
+
+
+@pytest.mark.parametrize('site', sorted(ORIGINS))
+@pytest.mark.parametrize('page_path', ['section/', 'section/page/2/'])
+def test_batched_cards_match_per_element(server, driver, site, page_path):
+    selectors = load_sites()[site].site['selectors']
+    url = server.site_url(site, page_path)
+    driver.get(url)
+    batched = SeleniumPage(driver, batch_extract=True).cards(selectors)
+    per_element = SeleniumPage(driver, batch_extract=False).cards(selectors)
+    assert batched
+    assert batched == per_element
+    http = HttpFetcher()
+    try:
+        expected = http.fetch(url).cards(selectors)
+    finally:
+        http.close()
+    assert [card['link'] for card in batched] == [card['link'] for card in expected]